@@ -1,16 +1,27 @@
 
 import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
 import pandas as pd
 import streamlit as st
 import pydeck as pdk
 from pathlib import Path
 
-from src.io import read_data, read_codebook, read_geojson
-from src.labels import build_label_maps, apply_value_labels
-from src.tables import freq, crosstab, summarize_numeric, crosstab_binned
-from src.map_layers import scatter_points, polygons_layer
-from src.features import apply_all
-from src.indicators import compute_indicators
+from src.cache import ResultCache
+from src.io import file_fingerprint, read_geojson
+from src.labels import load_label_maps, apply_value_labels
+from src.tables import freq, crosstab_binned
+from src.catalog import WAVE_COL, Catalog, catalog_root, config_waves
+from src.profiles import combine_profiles, load_profile, profile_cardinality, profile_freq, profile_stats
+from src.plan import PlanExecutor, plan_features, referenced_columns, referenced_variables
+from src.cube import build_cube, build_cube_chunked
+from src.estimation import design_from_config, estimate_indicators
+from src.export import EXPORT_FORMATS, EXPORT_MIME, EXPORT_SUFFIX, export_bytes, safe_part, table_title
+from src.map_layers import cell_size_m, fit_view, grid_bins, grid_layer, map_frame, polygons_layer, scatter_points
+from src.features import FEATURES, attach_features, available_features, derive_fuera_de_sector, feature_columns, feature_labels
+from src.spatial import POLYGON_COL, load_polygon_assignment
+from src.indicators import compute_indicators, compile_rules, indicator_masks, load_rules
+from src.utils import Profiler
 
 # ---- YAML import (no dynamic pip inside cached funcs). If missing, show friendly error and stop.
 try:
@@ -67,39 +78,177 @@ TAB_PATH = Path("config/tabulados.yaml")
 with open(CFG_PATH, "r", encoding="utf-8") as f:
     CFG = yaml.safe_load(f)
 
+IND_PATH = "config/indicators.yaml"
+
+@st.cache_resource(show_spinner=False)
+def load_rule_plan(path, mtime):
+    try:
+        return compile_rules(load_rules(path))
+    except Exception:
+        return []
+
+@st.cache_resource(show_spinner=False)
+def shared_result_cache(max_mb, spill_dir, spill_max_mb):
+    return ResultCache(max_bytes=int(max_mb * 2**20), spill_dir=spill_dir, spill_max_bytes=int(spill_max_mb * 2**20))
+
+@st.cache_resource(show_spinner=False)
+def load_plan_executor(path, mtime, _cache):
+    with open(path, "r", encoding="utf-8") as f:
+        return PlanExecutor(yaml.safe_load(f), cache=_cache)
+
+RC_CFG = CFG.get("result_cache") or {}
+RESULTS = shared_result_cache(RC_CFG.get("max_mb", 256), RC_CFG.get("spill_dir"), RC_CFG.get("spill_max_mb", 2048))
+IND_PLAN_MTIME = Path(IND_PATH).stat().st_mtime_ns if Path(IND_PATH).exists() else None
+IND_PLAN = load_rule_plan(IND_PATH, IND_PLAN_MTIME)
+executor = load_plan_executor(str(TAB_PATH), TAB_PATH.stat().st_mtime_ns, RESULTS)
+
+def _fingerprint(path):
+    return file_fingerprint(path, CFG.get("cache_dir")) if path and Path(path).exists() else None
+
+SETTINGS_KEY = json.dumps(CFG, sort_keys=True, default=str)
+WAVES = config_waves(CFG)
+WAVE_FPS = {w: _fingerprint(p) for w, p in WAVES.items()}
+CODEBOOK_FP = _fingerprint(CFG["codebook_path"])
+LABEL_MODE = CFG.get("value_labels_categorical", False)
+
+@st.cache_resource(show_spinner=False)
+def load_catalog(wave_fps, key_col):
+    return Catalog(catalog_root(CFG), WAVES, key_col=key_col, cache_dir=CFG.get("cache_dir"))
+
+CATALOG = load_catalog(tuple(WAVE_FPS.items()), CFG.get("key_filter_col"))
+
 @st.cache_data(show_spinner=False)
-def load_all(CFG):
-    df = read_data(CFG["data_path"])
-    cb = read_codebook(CFG["codebook_path"])
-    var_labels, val_labels = build_label_maps(cb, df_columns=list(df.columns))
-    geojson_polys = read_geojson(CFG["polygons_path"])
-    return df, var_labels, val_labels, geojson_polys
+def load_meta(catalog_key, codebook_fp, settings_key, _cfg):
+    all_columns = list(CATALOG.columns)
+    var_labels, val_labels = load_label_maps(_cfg["codebook_path"], df_columns=all_columns, cache_dir=_cfg.get("cache_dir"))
+    return all_columns, var_labels, val_labels, read_geojson(_cfg["polygons_path"])
 
-df, var_labels, val_labels, geojson_polys = load_all(CFG)
+@st.cache_resource(show_spinner=False, max_entries=16)
+def load_all(data_fp, codebook_fp, settings_key, plan_mtime, waves, sectors, _cfg, _plan, _rule_plan, _columns):
+    usecols = referenced_columns(_plan, _columns, rule_plan=_rule_plan, cfg=_cfg) if _cfg.get("project_columns", True) else None
+    return CATALOG.read(usecols, waves=waves, sectors=sectors)
 
-# Apply labels and derived features
-df_labeled = apply_value_labels(df, val_labels)
-df_labeled = apply_all(df_labeled)
-var_labels.setdefault('sexo_jefatura', 'Sexo de la jefatura')
+def load_columns(cols, val_labels):
+    def compute():
+        extra = CATALOG.read(list(cols), waves=selected_waves, sectors=sector_keys)
+        labels = {k: v for k, v in val_labels.items() if k in extra.columns}
+        return apply_value_labels(extra, labels, categorical=LABEL_MODE)
+    return RESULTS.get_or_compute(("columns", data_fp, CODEBOOK_FP, LABEL_MODE, cols), compute)
+
+@st.cache_resource(show_spinner=False)
+def column_profile(data_fp, codebook_fp, label_mode, by, weight, path, _columns, _val_labels):
+    return load_profile(path, list(_columns), _val_labels, by, weight, label_mode, CFG.get("cache_dir"), data_fp, codebook_fp)
+
+def sector_options(raw_values):
+    labeled = apply_value_labels(pd.DataFrame({key_filter_col: raw_values}, dtype=object), {k: v for k, v in val_labels.items() if k == key_filter_col})
+    options = {}
+    for raw, lab in zip(raw_values, labeled[key_filter_col]):
+        options.setdefault(lab, []).append(raw)
+    return options
+
+show_perf = st.sidebar.checkbox("Diagnóstico de rendimiento", value=bool(CFG.get("profiling", False)), key="cb_perf")
+prof = Profiler(enabled=show_perf, trace_memory=show_perf and bool(CFG.get("profiling_memory", False)))
+
+all_columns, var_labels, val_labels, geojson_polys = load_meta(CATALOG.key, CODEBOOK_FP, SETTINGS_KEY, CFG)
+var_labels.setdefault(WAVE_COL, "Ronda")
 
 # Sidebar filters
 st.sidebar.header("Filtros")
+wave_names = list(WAVES)
+selected_waves = ui_multiselect("Ronda", wave_names, default=wave_names[-1:], key="ms_ronda") if len(wave_names) > 1 else wave_names
+selected_waves = selected_waves or wave_names[-1:]
 key_filter_col = CFG.get("key_filter_col")
-available_cols = list(df_labeled.columns)
-if key_filter_col not in available_cols and available_cols:
-    nunique = df_labeled.nunique(dropna=True)
-    cand = nunique[(nunique >= 3) & (nunique <= 30)].sort_values(ascending=False)
-    key_filter_col = cand.index[0] if len(cand) > 0 else available_cols[0]
-
-if key_filter_col in df_labeled.columns:
-    values = sorted([v for v in df_labeled[key_filter_col].dropna().unique().tolist()])
+sector_keys = None
+if CATALOG.partitioned:
+    options = sector_options([v for v in CATALOG.sectors(selected_waves) if v is not None])
+    values = sorted(options)
     selected_values = ui_multiselect(_safe_label(var_labels, key_filter_col), values, default=values[:5] if values else [], key="ms_sector")
-    mask = df_labeled[key_filter_col].isin(selected_values) if selected_values else pd.Series(True, index=df_labeled.index)
-else:
-    st.sidebar.info("No se encontró columna de filtro global; usando todo el conjunto.")
-    mask = pd.Series(True, index=df_labeled.index)
+    sector_keys = [raw for v in selected_values for raw in options[v]] if selected_values else None
+data_fp = CATALOG.selection_key(selected_waves, sector_keys)
+
+with prof.stage("carga") as rec:
+    df = load_all(data_fp, CODEBOOK_FP, SETTINGS_KEY, (TAB_PATH.stat().st_mtime_ns, IND_PLAN_MTIME), tuple(selected_waves),
+                  tuple(sector_keys) if sector_keys is not None else None, CFG, executor.plan, IND_PLAN, all_columns)
+    rec["rows"] = len(df)
+with prof.stage("perfil de columnas", rows=len(all_columns)):
+    profiles = [column_profile(WAVE_FPS[w], CODEBOOK_FP, LABEL_MODE, CFG.get("key_filter_col"), CFG.get("weight_col"), WAVES[w],
+                               tuple(c for c in all_columns if c != WAVE_COL), val_labels) for w in selected_waves]
+    col_profile = combine_profiles(profiles)
+
+def frame_cardinality(frame, selected=None):
+    card = profile_cardinality(col_profile, selected)
+    rest = [c for c in frame.columns if c not in card.index]
+    return pd.concat([card, frame[rest].nunique(dropna=True)]) if rest else card
+
+def feature_memo(name, compute):
+    return RESULTS.get_or_compute(("feature", data_fp, CODEBOOK_FP, LABEL_MODE, name), compute)
+
+def feature_series(name):
+    base = column_frame(df_labeled, feature_columns(all_columns, [name]))
+    return attach_features(base, [name], memo=feature_memo)[name]
+
+def column_frame(frame, cols):
+    cols = [c for c in dict.fromkeys(cols) if c]
+    missing = tuple(c for c in cols if c not in frame.columns and c in all_columns)
+    features = [c for c in cols if c not in frame.columns and c not in all_columns and c in FEATURES]
+    if not missing and not features:
+        return frame[[c for c in cols if c in frame.columns]]
+    extra = load_columns(missing, val_labels) if missing else pd.DataFrame(index=frame.index)
+    derived = {c: feature_series(c).loc[frame.index] for c in features}
+    parts = {c: frame[c] if c in frame.columns else derived[c] if c in derived else extra[c].loc[frame.index]
+             for c in cols if c in frame.columns or c in extra.columns or c in derived}
+    return pd.DataFrame(parts, index=frame.index)
+
+# Apply labels and derived features
+with prof.stage("etiquetas", rows=len(df)):
+    df_labeled = apply_value_labels(df, val_labels, categorical=CFG.get("value_labels_categorical", False))
+    if df_labeled is df:
+        df_labeled = df.copy(deep=False)
+with prof.stage("variables derivadas", rows=len(df)):
+    df_labeled = attach_features(df_labeled, plan_features(executor.plan, IND_PLAN, CFG), memo=feature_memo)
+for name, label in feature_labels().items():
+    var_labels.setdefault(name, label)
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def polygon_assignment(data_fp, geo_fp, settings_key, _cfg, _df, _geojson):
+    return load_polygon_assignment(_df, _cfg.get("lat_col"), _cfg.get("lon_col"), _geojson, _cfg.get("polygons_key_prop"),
+                                   _cfg.get("cache_dir"), data_fp, geo_fp)
+
+geo_fp = _fingerprint(CFG["polygons_path"]) if geojson_polys.get("features") else None
+if geo_fp:
+    with prof.stage("unión espacial", rows=len(df)):
+        df_labeled[POLYGON_COL] = polygon_assignment(data_fp, geo_fp, SETTINGS_KEY, CFG, df, geojson_polys)
+        df_labeled["gps_fuera_de_sector"] = derive_fuera_de_sector(df_labeled, CFG.get("key_filter_col"))
+    var_labels.setdefault(POLYGON_COL, "Polígono (GPS)")
+
+mask = None
+if not CATALOG.partitioned:
+    available_cols = list(df_labeled.columns)
+    if key_filter_col not in available_cols and available_cols:
+        nunique = frame_cardinality(df_labeled).reindex(available_cols)
+        cand = nunique[(nunique >= 3) & (nunique <= 30)].sort_values(ascending=False)
+        key_filter_col = cand.index[0] if len(cand) > 0 else available_cols[0]
+    if key_filter_col in df_labeled.columns:
+        values = sorted([v for v in df_labeled[key_filter_col].dropna().unique().tolist()])
+        selected_values = ui_multiselect(_safe_label(var_labels, key_filter_col), values, default=values[:5] if values else [], key="ms_sector")
+        with prof.stage("filtro global", rows=len(df_labeled)):
+            mask = df_labeled[key_filter_col].isin(selected_values) if selected_values else None
+    else:
+        st.sidebar.info("No se encontró columna de filtro global; usando todo el conjunto.")
+        selected_values = []
 
-df_f = df_labeled[mask].copy()
+df_f = df_labeled if mask is None else df_labeled[mask]
+show_ci = st.sidebar.checkbox("Errores estándar e IC (réplicas bootstrap)", value=bool((CFG.get("variance") or {}).get("enabled", False)), key="cb_ci")
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def load_design(data_fp, variance, weight, label_mode, _df):
+    return design_from_config(_df, CFG, key=data_fp)
+
+try:
+    design = load_design(data_fp, json.dumps(CFG.get("variance") or {}, sort_keys=True), CFG.get("weight_col"), (CODEBOOK_FP, LABEL_MODE), df_labeled) if show_ci else None
+except MemoryError as e:
+    st.sidebar.warning(str(e))
+    design = None
 
 # KPIs
 st.title("Encuesta Dashboard")
@@ -118,15 +267,9 @@ else:
     col3.metric("#Grupos", "—")
 
 # Indicators
-from pathlib import Path as _P
-IND_PATH = _P("config/indicators.yaml")
-try:
-    with open(IND_PATH, "r", encoding="utf-8") as _f:
-        IND_RULES = yaml.safe_load(_f).get("rules", {})
-except Exception:
-    IND_RULES = {}
 with st.expander("📌 Indicadores clave (editables en config/indicators.yaml)"):
-    vals = compute_indicators(df_f, IND_RULES) if IND_RULES else {}
+    with prof.stage("indicadores", rows=len(df_f)):
+        vals = compute_indicators(df_f, IND_PLAN, weight=w_col) if IND_PLAN else {}
     if vals:
         cols = st.columns(min(4, len(vals)))
         i = 0
@@ -134,89 +277,169 @@ with st.expander("📌 Indicadores clave (editables en config/indicators.yaml)")
             col = cols[i % len(cols)]
             col.metric(name.replace("_", " ").title(), f"{v}%" if v is not None else "—")
             i += 1
+        if design is not None:
+            with prof.stage("estimación", name="indicadores", rows=len(df_f)):
+                ind_est = estimate_indicators(df_f, IND_PLAN, design)
+            st.dataframe(ind_est)
     else:
         st.caption("Configura reglas en indicators.yaml para ver métricas.")
 
 st.divider()
 st.header("Plan de tabulados (oficial)")
-with open(TAB_PATH, "r", encoding="utf-8") as f:
-    PLAN = yaml.safe_load(f)
-
-def apply_block_filter(df_in, spec: dict):
-    if not spec:
-        return df_in
-    df_out = df_in.copy()
-    # Exact equality lists
-    if "in" in spec:
-        for var, values in spec["in"].items():
-            if var in df_out.columns:
-                df_out = df_out[df_out[var].isin(values)]
-    # Case-insensitive substring contains (for labeled/unlabeled values)
-    if "in_text" in spec:
-        for var, values in spec["in_text"].items():
-            if var in df_out.columns:
-                s = df_out[var].astype(str).str.lower()
-                vals = [str(v).lower() for v in values]
-                keep = s.apply(lambda x: any(v in x for v in vals))
-                df_out = df_out[keep]
-    if "eq" in spec:
-        for var, value in spec["eq"].items():
-            if var in df_out.columns:
-                df_out = df_out[df_out[var] == value]
-    return df_out
-
-for block in PLAN.get("blocks", []):
-    bname = block.get("name", "Bloque")
-    st.subheader(bname)
-    bfilter = block.get("filter", {})
-    dblock = apply_block_filter(df_f, bfilter)
-    if dblock.empty:
+data_key = (data_fp, CODEBOOK_FP, LABEL_MODE, key_filter_col, tuple(selected_values))
+by_wave = len(selected_waves) > 1
+
+@st.cache_resource(show_spinner=False, max_entries=64)
+def load_cube(cube_fp, fkey, by, weight, label_mode, plan_mtime, _df, _plan, _waves):
+    chunk = int(CFG.get("cube_chunk_rows", 200_000))
+    if _df is not None and len(_df) <= chunk:
+        return build_cube(_df, by, _plan, weight=weight, fkeys=[fkey])
+    if _df is not None:
+        chunks = (_df.iloc[i:i + chunk] for i in range(0, len(_df), chunk))
+        return build_cube_chunked(chunks, by, _plan, weight=weight, fkeys=[fkey])
+    sub = {"filters": {fkey: _plan["filters"][fkey]}, "nodes": {fkey: _plan["nodes"].get(fkey, [])}}
+    if any(v in (POLYGON_COL, "gps_fuera_de_sector") for v in referenced_variables(sub)):
+        return None
+    features = plan_features(sub, cfg=CFG)
+    def prepare(chunk):
+        return attach_features(apply_value_labels(chunk, val_labels, categorical=LABEL_MODE), features)
+    chunks = CATALOG.iter_read(referenced_columns(sub, all_columns, cfg=CFG), waves=_waves, filter_spec=sub["filters"][fkey], skip=set(val_labels), batch_size=chunk)
+    return build_cube_chunked(chunks, by, _plan, weight=weight, prepare=prepare, fkeys=[fkey])
+
+def cube_loader(frame, by, weight, waves):
+    args = (by, weight, (CODEBOOK_FP, LABEL_MODE), TAB_PATH.stat().st_mtime_ns)
+    return lambda fkey: load_cube(CATALOG.selection_key(waves), fkey, *args, frame, executor.plan, tuple(waves))
+
+# Partitioned reads only hold the selected sectors, so their cube streams every sector of the waves from the catalog.
+cubes = None if by_wave else cube_loader(None if CATALOG.partitioned else df_labeled, key_filter_col, w_col, selected_waves)
+
+@st.cache_resource(show_spinner=False)
+def block_pool(workers):
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bloques")
+
+def compute_block(block, frame, key, cubes, selected, design, perf):
+    worker_prof = Profiler(enabled=perf.enabled, run_id=perf.run_id)
+    cube = None
+    if cubes is not None:
+        with worker_prof.stage("cubo", name=block["name"]):
+            cube = cubes(block["filter"])
+    if by_wave:
+        n_block, results = executor.run_block_by(frame, key, block, WAVE_COL, weight=w_col, profiler=worker_prof)
+    else:
+        n_block, results = executor.run_block(frame, key, block, weight=w_col, cube=cube, selected=selected, profiler=worker_prof)
+    estimates = dict(executor.estimate_block(frame, key, block, design, profiler=worker_prof)) if design is not None and n_block and not by_wave else {}
+    return n_block, results, estimates, worker_prof.records
+
+block_names = [b["name"] for b in executor.blocks]
+export_wave = ", ".join(selected_waves)
+export_sector = ", ".join(map(str, selected_values)) or "(todos)"
+
+def block_section(i, n_block, results):
+    tables = [(table_title(t, var_labels), t, res) for t, res in results if res is not None]
+    return export_wave, export_sector, i, block_names[i], n_block, tables
+
+def export_buttons(key, stem, blocks, sections):
+    def build(fmt):
+        return export_bytes(sections(), fmt, blocks, var_labels, val_labels)
+    for col, (fmt, label) in zip(st.columns(len(EXPORT_FORMATS)), EXPORT_FORMATS.items()):
+        col.download_button(label, partial(build, fmt), file_name=f"{stem}{EXPORT_SUFFIX[fmt]}", mime=EXPORT_MIME[fmt],
+                            key=f"{key}_{fmt}", on_click="ignore")
+
+def render_block(i, n_block, results, estimates):
+    if n_block == 0:
         st.info("Sin datos para este bloque con los filtros actuales.")
+        return
+    for table, res in results:
+        if res is None:
+            continue
+        if table[0] == "freq":
+            st.markdown(f"**Frecuencia:** {_safe_label(var_labels, table[1])}")
+        elif table[0] == "crosstab":
+            st.markdown(f"**Crosstab:** {_safe_label(var_labels, table[1])} × {_safe_label(var_labels, table[2])}")
+        else:
+            st.markdown(f"**Resumen:** {_safe_label(var_labels, table[1])}")
+        st.dataframe(res)
+        if estimates.get(table) is not None:
+            st.caption(f"Errores estándar e IC al {design.conf_level:.0%}")
+            st.dataframe(estimates[table])
+    export_buttons(f"dl_{i}", f"tabulados-{safe_part(block_names[i])}", {i: block_names[i]}, lambda: [block_section(i, n_block, results)])
+
+blocks_open = int(CFG.get("blocks_open", len(executor.blocks)))
+pool = block_pool(max(1, int(CFG.get("block_workers", 4))))
+pending = {}
+for i, block in enumerate(executor.blocks):
+    st.subheader(block["name"])
+    if not st.toggle("Mostrar bloque", value=i < blocks_open, key=f"blk_{i}"):
         continue
-    for spec in block.get("tables", []):
-        if "freq" in spec:
-            v = spec["freq"]
-            if v in dblock.columns:
-                st.markdown(f"**Frecuencia:** {_safe_label(var_labels, v)}")
-                st.dataframe(freq(dblock, v, weight=w_col))
-        elif "crosstab" in spec:
-            row = spec["crosstab"].get("row")
-            col = spec["crosstab"].get("col")
-            w  = spec["crosstab"].get("weight") or w_col
-            if row in dblock.columns and col in dblock.columns:
-                st.markdown(f"**Crosstab:** {_safe_label(var_labels, row)} × {_safe_label(var_labels, col)}")
-                st.dataframe(crosstab_binned(dblock, row, col, weight=w, normalize="index"))
-        elif "summary" in spec:
-            v = spec["summary"].get("var")
-            if v in dblock.columns:
-                st.markdown(f"**Resumen:** {_safe_label(var_labels, v)}")
-                st.dataframe(summarize_numeric(dblock, v, weight=w_col))
+    slot = st.empty()
+    slot.caption("Calculando…")
+    pending[pool.submit(compute_block, block, df_f, data_key, cubes, selected_values, design, prof)] = (i, slot)
+
+def plan_sections(frame=df_f, key=data_key, cubes=cubes, selected=selected_values):
+    futures = [pool.submit(compute_block, block, frame, key, cubes, selected, None, prof) for block in executor.blocks]
+    for i, future in enumerate(futures):
+        n_block, results, _, _ = future.result()
+        yield block_section(i, n_block, results)
+
+with st.expander("📦 Exportar plan completo"):
+    st.caption("Todos los bloques con los filtros actuales, incluidos los ocultos. Parquet y Arrow IPC se descargan como .zip con una tabla por archivo y las etiquetas de variables y valores en los metadatos del esquema.")
+    export_buttons("dl_plan", f"tabulados-{safe_part(export_wave)}", dict(enumerate(block_names)), plan_sections)
 
 st.divider()
+if geo_fp:
+    with st.expander("🗺️ Validación espacial (polígonos)"):
+        located = df_f[POLYGON_COL].notna()
+        outside = df_f["gps_fuera_de_sector"].fillna(False)
+        sc1, sc2, sc3 = st.columns(3)
+        sc1.metric("Con polígono", f"{int(located.sum()):,}")
+        sc2.metric("Sin polígono", f"{int((~located).sum()):,}")
+        sc3.metric("Fuera del sector declarado", f"{int(outside.sum()):,}")
+        if outside.any():
+            st.dataframe(df_f.loc[outside, [c for c in (CFG.get("id_col"), key_filter_col, POLYGON_COL) if c in df_f.columns]])
+        by_poly = compute_indicators(df_f, IND_PLAN, by=POLYGON_COL) if IND_PLAN else pd.DataFrame()
+        counts = df_f[POLYGON_COL].value_counts().rename("n")
+        st.dataframe(by_poly.join(counts, how="right") if not by_poly.empty else counts)
+
 with st.expander("🔧 Diagnóstico de etiquetas"):
-    df_cols = list(df.columns)
+    df_cols = list(all_columns)
     labeled_vars = set(var_labels.keys())
     sin_etiqueta = [c for c in df_cols if c not in labeled_vars]
     st.write("Variables en la base:", len(df_cols))
     st.write("Con etiqueta:", len(labeled_vars), " | Sin etiqueta:", len(sin_etiqueta))
     if sin_etiqueta:
         st.write("Ejemplos sin etiqueta:", sin_etiqueta[:20])
+perf_box = st.container()
 
 st.divider()
 st.header("Explorador de variables")
-vars_sorted = sorted(df_f.columns)
-labels_map = {v: _safe_label(var_labels, v) for v in vars_sorted}
-reverse_map = {labels_map[v]: v for v in vars_sorted}
-lab_options = sorted(reverse_map.keys())
+vars_sorted = sorted(set(all_columns) | set(df_f.columns) | set(available_features(all_columns)))
+
+@st.cache_data(show_spinner=False)
+def explorer_labels(codebook_fp, geo_fp, variables, _var_labels):
+    labels_map = {v: _safe_label(_var_labels, v) for v in variables}
+    reverse_map = {labels_map[v]: v for v in variables}
+    return labels_map, reverse_map, sorted(reverse_map.keys())
+
+labels_map, reverse_map, lab_options = explorer_labels(CODEBOOK_FP, geo_fp, tuple(vars_sorted), var_labels)
+profile_sel = selected_values if col_profile["by"] == key_filter_col else None
+use_profile = profile_sel is not None or not selected_values
 sel_lab = ui_selectbox("Selecciona una variable", lab_options, index=0, key="explorador_var")
 sel_var = reverse_map.get(sel_lab, vars_sorted[0] if vars_sorted else None)
-if sel_var and sel_var in df_f.columns:
+if sel_var and sel_var in vars_sorted:
     st.markdown(f"**Frecuencia (Explorador):** {_safe_label(var_labels, sel_var)}")
-    st.dataframe(freq(df_f, sel_var, weight=w_col))
+    stats = profile_stats(col_profile, sel_var, profile_sel) if use_profile else None
+    if stats:
+        bounds = f" | mín {stats['min']:g} | máx {stats['max']:g}" if pd.notna(stats["min"]) else ""
+        st.caption(f"Tipo {stats['dtype']} | {stats['rows']:,} filas | {stats['nulls']:,} nulos | {'' if stats['nunique_exact'] else '≤ '}{stats['nunique']:,} valores distintos{bounds}")
+    table = profile_freq(col_profile, sel_var, profile_sel, weighted=bool(w_col)) if use_profile and sel_var in all_columns else None
+    st.dataframe(table if table is not None else freq(column_frame(df_f, [sel_var, w_col]), sel_var, weight=w_col))
 
 st.divider()
 st.header("Tabulado ad-hoc")
-nunq_all = df_f.nunique(dropna=True) if not df_f.empty else df_labeled.nunique(dropna=True)
+if use_profile:
+    nunq_all = frame_cardinality(df_f, profile_sel)
+else:
+    nunq_all = df_f.nunique(dropna=True).combine_first(profile_cardinality(col_profile))
 cat_vars = [c for c in nunq_all.index if 2 <= nunq_all[c] <= 20]
 lab_cat = sorted([labels_map.get(c, c) for c in cat_vars])
 row_lab = ui_selectbox("Fila (row)", lab_cat, key="adhoc_row")
@@ -226,24 +449,63 @@ col_var = reverse_map.get(col_lab)
 peso_opts = ["(sin peso)"] + ([w_col] if w_col and w_col in df_f.columns else [])
 peso_lab = ui_selectbox("Ponderación", peso_opts, key="adhoc_w")
 peso_sel = None if peso_lab == "(sin peso)" else w_col
-if row_var and col_var and row_var in df_f.columns and col_var in df_f.columns:
+if row_var and col_var and row_var in vars_sorted and col_var in vars_sorted:
     st.markdown(f"**Crosstab ad-hoc:** {_safe_label(var_labels, row_var)} × {_safe_label(var_labels, col_var)}")
-    st.dataframe(crosstab_binned(df_f, row_var, col_var, weight=peso_sel, normalize="index"))
+    st.dataframe(crosstab_binned(column_frame(df_f, [row_var, col_var, peso_sel]), row_var, col_var, weight=peso_sel, normalize="index"))
 
 st.divider()
 st.header("Mapa (pydeck)")
 lat_col = CFG.get("lat_col")
 lon_col = CFG.get("lon_col")
-initial_view = pdk.ViewState(latitude=13.7, longitude=-89.2, zoom=8)
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def map_bins(data_key, zoom, lat0, plan_mtime, _pts, _plan):
+    masks = indicator_masks(_pts, _plan) if _plan else None
+    cell_m = cell_size_m(zoom, lat0)
+    return cell_m, grid_bins(_pts[lat_col].to_numpy(), _pts[lon_col].to_numpy(), cell_m, lat0, rates=masks)
+
 layers = []
 poly_layer = polygons_layer(geojson_polys)
 if poly_layer:
     layers.append(poly_layer)
-pt_layer = scatter_points(df_f, lat_col, lon_col)
-if pt_layer:
-    layers.append(pt_layer)
-if layers:
-    tooltip = {"text": f"{key_filter_col}: {{{ {key_filter_col} }}}"}
-    st.pydeck_chart(pdk.Deck(map_style="mapbox://styles/mapbox/light-v9", initial_view_state=initial_view, layers=layers, tooltip=tooltip))
-else:
-    st.info("No hay capas cargadas. Sube polygons.geojson y verifica lat/lon en settings.yaml.")
+with prof.stage("mapa", rows=len(df_f)):
+    pts = map_frame(df_f, lat_col, lon_col, extra=[key_filter_col] + [step["var"] for step in IND_PLAN])
+    initial_view = pdk.ViewState(latitude=13.7, longitude=-89.2, zoom=8)
+    tooltip = {"text": f"{key_filter_col}: {{{key_filter_col}}}"}
+    if pts is not None:
+        lat0, lon0, fit_zoom = fit_view(pts[lat_col].to_numpy(), pts[lon_col].to_numpy())
+        mc1, mc2, mc3 = st.columns(3)
+        map_mode = mc1.radio("Vista", ["Celdas", "Puntos"], horizontal=True, key="map_mode")
+        zoom = mc2.slider("Zoom", 3.0, 18.0, float(fit_zoom), 0.5, key="map_zoom")
+        initial_view = pdk.ViewState(latitude=lat0, longitude=lon0, zoom=zoom)
+        if map_mode == "Celdas":
+            rate_names = [step["name"] for step in IND_PLAN if step["var"] in pts.columns and step["kind"]]
+            color_by = mc3.selectbox("Color", ["n"] + rate_names, key="map_color")
+            cell_m, bins = map_bins(data_key, zoom, round(lat0, 2), IND_PLAN_MTIME, pts, IND_PLAN)
+            layers.append(grid_layer(bins, cell_m, color_by=color_by))
+            tooltip = {"text": "n: {n}" + "".join(f"\n{name}: {{{name}}}%" for name in rate_names)}
+            st.caption(f"{len(bins):,} celdas de {cell_m:,.0f} m a partir de {len(pts):,} puntos.")
+        else:
+            layers.append(scatter_points(pts, lat_col, lon_col, tooltip_cols=[key_filter_col]))
+    if layers:
+        st.pydeck_chart(pdk.Deck(map_style="mapbox://styles/mapbox/light-v9", initial_view_state=initial_view, layers=layers, tooltip=tooltip))
+    else:
+        st.info("No hay capas cargadas. Sube polygons.geojson y verifica lat/lon en settings.yaml.")
+
+for future in as_completed(pending):
+    n_block, results, estimates, records = future.result()
+    prof.records.extend(records)
+    i, slot = pending[future]
+    with slot.container():
+        render_block(i, n_block, results, estimates)
+
+if show_perf:
+    with perf_box.expander("⏱️ Diagnóstico de rendimiento", expanded=True):
+        st.caption("Tiempo de pared por etapa de esta ejecución (las funciones en caché miden el acierto de caché).")
+        st.dataframe(prof.summary())
+        st.dataframe(prof.frame())
+        st.caption("Caché compartida de resultados (todas las sesiones)")
+        st.dataframe(pd.DataFrame([RESULTS.info()]))
+        jsonl = prof.to_jsonl(CFG.get("profiling_log"))
+        st.download_button("Descargar JSONL", jsonl, file_name=f"rendimiento-{prof.run_id}.jsonl", mime="application/x-ndjson")
+prof.close()
@@ -0,0 +1,146 @@
+
+import argparse
+import json
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import yaml
+
+from benchmarks.synthetic import write_survey
+from src.cube import build_cube
+from src.features import apply_all
+from src.indicators import compile_rules, compute_indicators, load_rules
+from src.io import read_codebook, read_data
+from src.labels import apply_value_labels, build_label_maps
+from src.plan import PlanExecutor
+from src.tables import crosstab_binned, freq
+
+SIZES = {"10k": 10_000, "100k": 100_000, "1M": 1_000_000}
+
+def _size(text: str) -> int:
+    return SIZES.get(text, None) or int(float(text.lower().replace("k", "e3").replace("m", "e6")))
+
+def best_of(func: Callable, repeat: int, setup: Optional[Callable] = None) -> float:
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        t0 = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+def run_plan(executor: PlanExecutor, df: pd.DataFrame, key: tuple, cube: Optional[dict] = None):
+    for block in executor.blocks:
+        executor.run_block(df, key, block, cube=cube)
+
+def bench_size(rows: int, workdir: Path, plan: dict, rules: dict, repeat: int = 3, extra_cols: int = 0,
+               cardinality: int = 8, seed: int = 0, log=sys.stderr) -> Dict[str, float]:
+    data_dir = workdir / f"synthetic-{rows}-{extra_cols}-{cardinality}-{seed}"
+    t0 = time.perf_counter()
+    paths = write_survey(str(data_dir), rows, extra_cols=extra_cols, cardinality=cardinality, seed=seed)
+    print(f"  datos sintéticos: {time.perf_counter() - t0:.1f}s", file=log)
+    cache_dir = data_dir / ".cache"
+    out: Dict[str, float] = {}
+
+    def clear_cache():
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    out["read_data_csv"] = best_of(lambda: read_data(paths["data_path"]), repeat)
+    out["read_data_ingest"] = best_of(lambda: read_data(paths["data_path"], cache_dir=str(cache_dir)), repeat, setup=clear_cache)
+    out["read_data_parquet"] = best_of(lambda: read_data(paths["data_path"], cache_dir=str(cache_dir)), repeat)
+    df = read_data(paths["data_path"], cache_dir=str(cache_dir))
+    cb = read_codebook(paths["codebook_path"])
+    out["build_label_maps"] = best_of(lambda: build_label_maps(cb, df_columns=list(df.columns)), repeat)
+    _, val_labels = build_label_maps(cb, df_columns=list(df.columns))
+    out["apply_value_labels"] = best_of(lambda: apply_value_labels(df, val_labels), repeat)
+    out["apply_value_labels_categorical"] = best_of(lambda: apply_value_labels(df, val_labels, categorical=True), repeat)
+    labeled = apply_all(apply_value_labels(df, val_labels, categorical=True))
+    out["freq"] = best_of(lambda: freq(labeled, "p004"), repeat)
+    out["crosstab_binned"] = best_of(lambda: crosstab_binned(labeled, "p004", "p029"), repeat)
+    rule_plan = compile_rules(rules)
+    out["compute_indicators"] = best_of(lambda: compute_indicators(labeled, rule_plan), repeat)
+    out["plan_rows"] = best_of(lambda: run_plan(PlanExecutor(plan), labeled, ("bench",)), repeat)
+    executor = PlanExecutor(plan)
+    out["plan_cube_build"] = best_of(lambda: build_cube(labeled, "SECTOR", executor.plan), repeat)
+    cube = build_cube(labeled, "SECTOR", executor.plan)
+    out["plan_cube_tables"] = best_of(lambda: run_plan(PlanExecutor(plan), None, ("bench",), cube=cube), repeat)
+    return {k: round(v, 6) for k, v in out.items()}
+
+def compare(current: dict, baseline: dict, tolerance: float = 0.25, min_seconds: float = 0.005) -> pd.DataFrame:
+    rows = []
+    for size, results in current["results"].items():
+        base = baseline.get("results", {}).get(size, {})
+        for name, secs in results.items():
+            ref = base.get(name)
+            ratio = secs / ref if ref else np.nan
+            regression = bool(ref and ratio > 1 + tolerance and secs - ref > min_seconds)
+            rows.append({"filas": size, "prueba": name, "base_s": ref, "actual_s": secs,
+                         "razón": round(ratio, 3) if ref else None, "regresión": regression})
+    return pd.DataFrame(rows)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Mide el rendimiento de lectura, etiquetas, tablas, indicadores y plan con encuestas sintéticas.")
+    ap.add_argument("--sizes", default="10k,100k,1M", help="Tamaños separados por coma (10k, 100k, 1M o número de filas).")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--extra-cols", type=int, default=0)
+    ap.add_argument("--cardinality", type=int, default=8)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--plan", default="config/tabulados.yaml")
+    ap.add_argument("--rules", default="config/indicators.yaml")
+    ap.add_argument("--workdir", default=None, help="Directorio para los datos sintéticos (por defecto, temporal).")
+    ap.add_argument("--out", default=None, help="Guarda los resultados en este JSON.")
+    ap.add_argument("--baseline", default="benchmarks/baseline.json")
+    ap.add_argument("--save-baseline", action="store_true", help="Sobrescribe la línea base con estos resultados.")
+    ap.add_argument("--tolerance", type=float, default=0.25)
+    ap.add_argument("--fail-on-regression", action="store_true")
+    args = ap.parse_args(argv)
+
+    with open(args.plan, "r", encoding="utf-8") as f:
+        plan = yaml.safe_load(f)
+    rules = load_rules(args.rules)
+    workdir = Path(args.workdir) if args.workdir else Path(tempfile.mkdtemp(prefix="bench-"))
+    current = {
+        "meta": {"fecha": datetime.now(timezone.utc).isoformat(timespec="seconds"), "python": platform.python_version(),
+                 "pandas": pd.__version__, "numpy": np.__version__, "plataforma": platform.platform(),
+                 "repeat": args.repeat, "extra_cols": args.extra_cols, "cardinality": args.cardinality, "seed": args.seed},
+        "results": {},
+    }
+    try:
+        for label in args.sizes.split(","):
+            rows = _size(label.strip())
+            print(f"{rows:,} filas", file=sys.stderr)
+            current["results"][str(rows)] = bench_size(rows, workdir, plan, rules, repeat=args.repeat, extra_cols=args.extra_cols,
+                                                       cardinality=args.cardinality, seed=args.seed)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.out:
+        Path(args.out).write_text(json.dumps(current, indent=2, ensure_ascii=False), encoding="utf-8")
+    baseline_path = Path(args.baseline)
+    regressions = 0
+    if baseline_path.exists() and not args.save_baseline:
+        table = compare(current, json.loads(baseline_path.read_text(encoding="utf-8")), tolerance=args.tolerance)
+        print(table.to_string(index=False))
+        regressions = int(table["regresión"].sum())
+        print(f"{regressions} regresiones (tolerancia {args.tolerance:.0%})")
+    else:
+        for size, results in current["results"].items():
+            print(pd.Series(results, name=f"{size} filas (s)").to_string())
+    if args.save_baseline:
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        baseline_path.write_text(json.dumps(current, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"Línea base guardada en {baseline_path}")
+    return 1 if regressions and args.fail_on_regression else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+
+import argparse
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+SECTORS = {"INDIRECTO": 0.76, "La Paz Poniente": 0.09, "Punta Roca": 0.08, "El Obispo": 0.05, "La Paz Oriente": 0.02}
+
+# (kind, values -> probabilities, section). Sections: "all", "vivienda" (only dwellings) and "negocio" (only businesses).
+SCHEMA: Dict[str, tuple] = {
+    "p004": ("text", {"Vivienda": 0.43, "Negocio": 0.38, "Otro": 0.10, "Estructura vacia": 0.04, "Ambos": 0.04,
+                      "Iglesia": 0.004, "Escuela": 0.003, "Servicios de salud": 0.003}, "all"),
+    "p005": ("coded", {1: 0.75, 2: 0.20, 3: 0.05}, "all"),
+    "p006": ("text", {"Lamina": 0.67, "Laminas de fibrocemento": 0.15, "Otro": 0.08, "Losa": 0.07, "Teja de barro": 0.03}, "all"),
+    "p007": ("text", {"Bloque de cemento": 0.77, "Lamina": 0.14, "Otro": 0.04, "Madera": 0.03, "Ladrillo de barro": 0.02}, "all"),
+    "p008": ("text", {"Cemento": 0.56, "Ceramica": 0.31, "Tierra": 0.11, "Otro": 0.02}, "all"),
+    "nvivienda": ("count", {1: 0.8, 2: 0.15, 3: 0.05}, "all"),
+    "p009a": ("count", {1: 0.46, 2: 0.33, 3: 0.10, 4: 0.02, 5: 0.05, 6: 0.02, 7: 0.02}, "vivienda"),
+    "p009b": ("coded", {1: 0.87, 2: 0.13}, "vivienda"),
+    "p010": ("text", {"Propia con título": 0.43, "Propia sin título": 0.39, "Alquilada": 0.07, "Prestada": 0.05,
+                      "Ocupante": 0.03, "Otro": 0.02, "99": 0.01}, "vivienda"),
+    "p011": ("count", {1: 0.11, 2: 0.28, 3: 0.27, 4: 0.16, 5: 0.08, 6: 0.04, 7: 0.02, 8: 0.01, 10: 0.01, -999999999: 0.02}, "vivienda"),
+    "p012": ("year", (1960, 2025), "vivienda"),
+    "p013": ("count", {0: 0.01, 1: 0.53, 2: 0.36, 3: 0.04, 4: 0.04, -9: 0.01, -999999999: 0.01}, "vivienda"),
+    "p014": ("text", {"Trabajo informal": 0.48, "Trabajo formal": 0.47, "otro": 0.03, "Remesas": 0.01, "Ayuda Estatal": 0.01}, "vivienda"),
+    "p015": ("text", {"Sí": 0.9, "No": 0.1}, "vivienda"),
+    "p016": ("text", {"Diario": 0.63, "Semanal": 0.19, "Por horas": 0.10, "No recibe": 0.08}, "vivienda"),
+    "p017": ("text", {"Anda": 0.83, "Cantarera": 0.09, "Pozo propio": 0.02, "6": 0.06}, "vivienda"),
+    "p018": ("text", {"Inodoro conectado a red": 0.58, "Fosa séptica": 0.30, "Letrina": 0.09, "No tiene": 0.03}, "vivienda"),
+    "p019": ("text", {"Exclusivo del hogar": 0.84, "Compartido con otros hogares": 0.16}, "vivienda"),
+    "p020": ("text", {"Alcantarillado": 0.70, "Fosa": 0.22, "Otro": 0.06, "Calle": 0.02}, "vivienda"),
+    "p021": ("count", {0: 0.5, 1: 0.3, 2: 0.15, 3: 0.05}, "vivienda"),
+    "p022": ("text", {"Gas": 0.8, "Leña": 0.15, "Electricidad": 0.05}, "vivienda"),
+    "p025": ("text", {"Tienda/comercio": 0.49, "Restaurante": 0.25, "Otro": 0.18, "Alojamiento": 0.05, "Servicios varios": 0.03}, "negocio"),
+    "p026": ("date", ("2005-01-01", "2025-07-15"), "negocio"),
+    "p027": ("text", {"Sí": 0.6, "No": 0.4}, "negocio"),
+    "p028": ("text", {"Alquilado": 0.58, "Propio": 0.25, "Otro": 0.14, "Prestado": 0.02, "Posesión": 0.01}, "negocio"),
+    "p029": ("count", {0: 0.1, 1: 0.34, 2: 0.26, 3: 0.13, 4: 0.06, 5: 0.03, 7: 0.04, 10: 0.02, 15: 0.01, -9: 0.01}, "negocio"),
+    "p030": ("count", {0: 0.25, 1: 0.40, 2: 0.20, 3: 0.08, 5: 0.03, 10: 0.02, -9: 0.02}, "negocio"),
+    "p031": ("text", {"Menos de $365": 0.68, "$365 a $730": 0.32}, "negocio"),
+    "p032": ("text", {"Sí": 0.3, "No": 0.7}, "negocio"),
+    "p035": ("text", {"Playa": 0.4, "Malecón": 0.3, "Plaza gastronómica": 0.2, "Otro": 0.1}, "all"),
+    "p035tx": ("free", ("malecón", "plaza gastronómica", "estadio", "playa", "no respondio"), "all"),
+    "p036": ("text", {"Semanal": 0.27, "Nunca": 0.23, "Diario": 0.20, "Mensual": 0.17, "0": 0.13}, "all"),
+    "sexo_jefe_estr_hg1": ("coded", {0: 0.69, 1: 0.17, 2: 0.14}, "all"),
+}
+
+CODE_LABELS = {
+    "p005": {1: "Bueno", 2: "Regular", 3: "Malo"},
+    "p009b": {1: "Un hogar", 2: "Dos o más hogares"},
+    "sexo_jefe_estr_hg1": {0: "No responde", 1: "Masculino", 2: "Femenino"},
+}
+
+VAR_LABELS = {
+    "p004": "Uso de la estructura", "p005": "Estado de la estructura", "p006": "Material del techo",
+    "p007": "Material de las paredes", "p008": "Material del piso", "p010": "Tenencia de la vivienda",
+    "p015": "Acceso a agua", "p018": "Servicio sanitario", "p027": "Permiso de operación",
+    "p029": "Personas que trabajan en el negocio", "p030": "Personal formal", "p036": "Frecuencia de visita",
+    "sexo_jefe_estr_hg1": "Sexo de la jefatura",
+}
+
+def _choice(rng: np.random.Generator, dist: dict, n: int) -> np.ndarray:
+    values = list(dist)
+    p = np.asarray(list(dist.values()), dtype="float64")
+    return np.asarray(values, dtype=object)[rng.choice(len(values), size=n, p=p / p.sum())]
+
+def _column(rng: np.random.Generator, kind: str, spec, n: int) -> np.ndarray:
+    if kind in ("text", "free") and isinstance(spec, dict):
+        return _choice(rng, spec, n)
+    if kind == "free":
+        parts = np.asarray(spec, dtype=object)
+        return parts[rng.integers(0, len(parts), n)] + np.where(rng.random(n) < 0.5, "", " y " + parts[rng.integers(0, len(parts), n)])
+    if kind in ("coded", "count"):
+        return _choice(rng, spec, n).astype("float64")
+    if kind == "year":
+        return rng.integers(spec[0], spec[1] + 1, n).astype("float64")
+    lo, hi = (pd.Timestamp(d).value // 86_400_000_000_000 for d in spec)
+    return pd.to_datetime(rng.integers(lo, hi + 1, n), unit="D").strftime("%Y-%m-%d").to_numpy(dtype=object)
+
+def generate_survey(rows: int, extra_cols: int = 0, cardinality: int = 8, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    cols = {
+        "llave": np.char.add("k", np.arange(rows).astype(str)).astype(object),
+        "SECTOR": _choice(rng, SECTORS, rows),
+        "p002__Latitude": rng.normal(13.486, 0.0016, rows).round(7),
+        "p002__Longitude": rng.normal(-89.3206, 0.0044, rows).round(7),
+    }
+    use = None
+    for var, (kind, spec, section) in SCHEMA.items():
+        vals = _column(rng, kind, spec, rows)
+        if use is not None and section != "all":
+            allowed = ("vivienda", "ambos") if section == "vivienda" else ("negocio", "ambos")
+            keep = np.isin(np.char.lower(use.astype(str)), allowed)
+            vals = np.where(keep, vals, np.nan if vals.dtype.kind == "f" else None)
+        vals[rng.random(rows) < 0.03] = np.nan if vals.dtype.kind == "f" else None
+        cols[var] = vals
+        if var == "p004":
+            use = vals
+    for i in range(extra_cols):
+        name = f"x{i:03d}"
+        if i % 3 == 0:
+            cols[name] = rng.integers(1, cardinality + 1, rows).astype("float64")
+        elif i % 3 == 1:
+            cols[name] = np.asarray([f"cat {j}" for j in range(cardinality)], dtype=object)[rng.integers(0, cardinality, rows)]
+        else:
+            cols[name] = rng.gamma(2.0, 50.0, rows).round(2)
+    return pd.DataFrame(cols)
+
+def generate_codebook(df: pd.DataFrame, cardinality: int = 8) -> pd.DataFrame:
+    rows: List[tuple] = []
+    for var in df.columns:
+        codes = CODE_LABELS.get(var)
+        if codes is None and var.startswith("x") and int(var[1:]) % 3 == 0:
+            codes = {j: f"Categoría {j}" for j in range(1, cardinality + 1)}
+        label = VAR_LABELS.get(var, var)
+        if not codes:
+            rows.append((var, None, None, label))
+            continue
+        for code, lab in codes.items():
+            rows.append((var, code, lab, label))
+    return pd.DataFrame(rows, columns=["variable", "value", "label_value", "label_variable"])
+
+def write_survey(out_dir: str, rows: int, extra_cols: int = 0, cardinality: int = 8, seed: int = 0) -> Dict[str, str]:
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    df = generate_survey(rows, extra_cols=extra_cols, cardinality=cardinality, seed=seed)
+    data_path, codebook_path = out / "encuesta.csv", out / "Codebook.xlsx"
+    df.to_csv(data_path, index=False)
+    generate_codebook(df, cardinality=cardinality).to_excel(codebook_path, index=False)
+    return {"data_path": str(data_path), "codebook_path": str(codebook_path)}
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Genera una encuesta sintética con su libro de códigos.")
+    ap.add_argument("--rows", type=int, default=10_000)
+    ap.add_argument("--extra-cols", type=int, default=0)
+    ap.add_argument("--cardinality", type=int, default=8)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", required=True)
+    args = ap.parse_args(argv)
+    paths = write_survey(args.out, args.rows, extra_cols=args.extra_cols, cardinality=args.cardinality, seed=args.seed)
+    print(paths["data_path"], paths["codebook_path"])
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,184 @@
+
+import argparse
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import yaml
+
+from src.features import FEATURES, attach_features, feature_labels
+from src.catalog import WAVE_COL, Catalog, catalog_root, config_waves, wave_name
+from src.cube import build_cube_chunked, cube_groups
+from src.export import SINKS, table_title
+from src.io import data_columns, iter_data_chunks, read_data
+from src.labels import apply_value_labels, load_label_maps
+from src.plan import PlanExecutor, plan_features, referenced_columns
+
+ALL_SECTORS = "(todos)"
+
+_STATE: Dict[str, object] = {}
+
+def _load_yaml(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return yaml.safe_load(f) or {}
+
+def _label_maps(cfg: dict, columns: List[str]):
+    var_labels, val_labels = load_label_maps(cfg["codebook_path"], df_columns=columns, cache_dir=cfg.get("cache_dir"))
+    for name, label in feature_labels().items():
+        var_labels.setdefault(name, label)
+    var_labels.setdefault(WAVE_COL, "Ronda")
+    return var_labels, val_labels
+
+def _wave_labels(cfg: dict, columns: List[str], features: Optional[List[str]] = None):
+    var_labels, val_labels = _label_maps(cfg, columns)
+    categorical = cfg.get("value_labels_categorical", False)
+    features = list(FEATURES) if features is None else features
+    return var_labels, lambda df: attach_features(apply_value_labels(df, val_labels, categorical=categorical), features), set(val_labels)
+
+def _wave_columns(cfg: dict, data_path: str, plan: Optional[dict]):
+    columns = data_columns(data_path, cache_dir=cfg.get("cache_dir"))
+    usecols = referenced_columns(plan, columns, cfg=cfg) if plan and cfg.get("project_columns", True) else None
+    return columns, usecols
+
+def load_wave(cfg: dict, data_path: str, plan: Optional[dict] = None):
+    columns, usecols = _wave_columns(cfg, data_path, plan)
+    df = read_data(data_path, columns=usecols, cache_dir=cfg.get("cache_dir"))
+    var_labels, prepare, _ = _wave_labels(cfg, columns, plan_features(plan, cfg=cfg) if plan else None)
+    return prepare(df), var_labels
+
+def open_catalog(cfg: dict, waves: Dict[str, str], build: bool = True) -> Catalog:
+    return Catalog(catalog_root(cfg), waves, key_col=cfg.get("key_filter_col"), cache_dir=cfg.get("cache_dir"), build=build)
+
+def _init_worker(cfg: dict, plan: dict, waves: Dict[str, str], chunked: bool = False):
+    _STATE["cfg"] = cfg
+    _STATE["executor"] = PlanExecutor(plan)
+    _STATE["waves"] = waves
+    if chunked:
+        return
+    catalog = _STATE["catalog"] = open_catalog(cfg, waves, build=False)
+    executor = _STATE["executor"]
+    _STATE["usecols"] = referenced_columns(executor.plan, catalog.columns, cfg=cfg) if cfg.get("project_columns", True) else None
+    _STATE["labels"] = _wave_labels(cfg, catalog.columns, plan_features(executor.plan, cfg=cfg))
+
+def run_task(wave: str, sector, block_idx: int):
+    t0 = time.perf_counter()
+    cfg, executor, catalog = _STATE["cfg"], _STATE["executor"], _STATE["catalog"]
+    var_labels, prepare, labeled = _STATE["labels"]
+    block = executor.blocks[block_idx]
+    key_col = cfg.get("key_filter_col")
+    keys = None if sector == ALL_SECTORS or not catalog.partitioned else [v for v in catalog.sectors([wave]) if str(v) == sector]
+    raw = catalog.read(_STATE["usecols"], waves=[wave], sectors=keys,
+                       filter_spec=executor.plan["filters"][block["filter"]], skip=labeled)
+    if sector != ALL_SECTORS and not catalog.partitioned and key_col in raw.columns:
+        raw = raw[raw[key_col].astype(str) == sector]
+    df = prepare(raw)
+    n, results = executor.run_block(df, (wave, sector, block["filter"]), block, weight=cfg.get("weight_col"))
+    tables = [(table_title(t, var_labels), t, res) for t, res in results if res is not None]
+    return wave, sector, block_idx, n, tables, time.perf_counter() - t0
+
+def run_wave_chunked(wave: str, chunksize: int, sectors: Optional[List[str]] = None):
+    t0 = time.perf_counter()
+    cfg, executor = _STATE["cfg"], _STATE["executor"]
+    path = _STATE["waves"][wave]
+    columns, usecols = _wave_columns(cfg, path, executor.plan)
+    var_labels, prepare, _ = _wave_labels(cfg, columns, plan_features(executor.plan, cfg=cfg))
+    key_col, weight = cfg.get("key_filter_col"), cfg.get("weight_col")
+    chunks = iter_data_chunks(path, columns=usecols, chunksize=chunksize, cache_dir=cfg.get("cache_dir"))
+    cube = build_cube_chunked(chunks, key_col, executor.plan, weight=weight, prepare=prepare)
+    build_time = time.perf_counter() - t0
+    out = []
+    for sector in [ALL_SECTORS] + (sectors or sorted(cube_groups(cube), key=str)):
+        selected = None if sector == ALL_SECTORS else [v for v in cube_groups(cube) if str(v) == str(sector)]
+        for i, block in enumerate(executor.blocks):
+            t1 = time.perf_counter()
+            n, results = executor.run_block(None, (wave, sector), block, weight=weight, cube=cube, selected=selected)
+            tables = [(table_title(t, var_labels), t, res) for t, res in results if res is not None]
+            out.append((wave, sector, i, n, tables, time.perf_counter() - t1))
+    return build_time, out
+
+def _in_order(futures: list):
+    index = {fut: i for i, fut in enumerate(futures)}
+    ready, pos = {}, 0
+    for fut in as_completed(futures):
+        ready[index[fut]] = fut.result()
+        while pos in ready:
+            yield ready.pop(pos)
+            pos += 1
+
+def run_batch(cfg: dict, plan: dict, waves: Dict[str, str], out: str, fmt: str = "xlsx",
+              sectors: Optional[List[str]] = None, workers: Optional[int] = None,
+              chunksize: Optional[int] = None, log=sys.stderr) -> Dict[str, float]:
+    executor = PlanExecutor(plan)
+    key_col = cfg.get("key_filter_col")
+    waves = {wave_name(w): p for w, p in waves.items()}
+    catalog = open_catalog(cfg, waves)
+    sink = SINKS[fmt](out, dict(enumerate(b["name"] for b in executor.blocks)), *_label_maps(cfg, catalog.columns))
+    block_time: Dict[str, float] = defaultdict(float)
+    n_tasks = 0
+    t0 = time.perf_counter()
+
+    def emit(wave, sector, block_idx, n, tables, elapsed):
+        name = executor.blocks[block_idx]["name"]
+        block_time[name] += elapsed
+        sink.write(wave, sector, block_idx, name, n, tables)
+        print(f"[{elapsed:7.2f}s] {wave} | {sector} | {name} ({len(tables)} tablas)", file=log)
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(cfg, plan, waves, bool(chunksize))) as pool:
+            if chunksize:
+                futures = [pool.submit(run_wave_chunked, wave, chunksize, sectors) for wave in waves]
+                for build_time, results in _in_order(futures):
+                    print(f"[{build_time:7.2f}s] cubo por bloques de {chunksize:,} filas", file=log)
+                    for res in results:
+                        n_tasks += 1
+                        emit(*res)
+            else:
+                tasks = []
+                for wave, path in waves.items():
+                    if catalog.partitioned:
+                        wave_sectors = sectors or sorted(str(v) for v in catalog.sectors([wave]) if v is not None)
+                    else:
+                        keys = read_data(path, columns=[key_col] if key_col else [], cache_dir=cfg.get("cache_dir"))
+                        wave_sectors = sectors or (sorted(keys[key_col].dropna().astype(str).unique()) if key_col in keys.columns else [])
+                    for sector in [ALL_SECTORS] + list(wave_sectors):
+                        for i in range(len(executor.blocks)):
+                            tasks.append((wave, sector, i))
+                futures = [pool.submit(run_task, *t) for t in tasks]
+                for res in _in_order(futures):
+                    n_tasks += 1
+                    emit(*res)
+    finally:
+        sink.close()
+    for name, secs in block_time.items():
+        print(f"{secs:8.2f}s  {name}", file=log)
+    print(f"Total: {time.perf_counter() - t0:.2f}s, {n_tasks} tareas", file=log)
+    return dict(block_time)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Genera el plan de tabulados sin Streamlit.")
+    ap.add_argument("--settings", default="config/settings.yaml")
+    ap.add_argument("--plan", default="config/tabulados.yaml")
+    ap.add_argument("--data", action="append", default=[], help="Archivo de datos (repetible, una ronda por archivo). Use ronda=ruta para nombrarla.")
+    ap.add_argument("--sector", action="append", default=[], help="Limita los sectores a procesar (repetible).")
+    ap.add_argument("--out", required=True, help="Archivo .xlsx, o directorio (o .zip) de salida Parquet/Arrow IPC.")
+    ap.add_argument("--format", choices=sorted(SINKS), default=None)
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--chunksize", type=int, default=None, help="Procesa cada ronda por bloques de N filas (memoria acotada).")
+    args = ap.parse_args(argv)
+
+    cfg = _load_yaml(args.settings)
+    plan = _load_yaml(args.plan)
+    waves: Dict[str, str] = {}
+    for item in args.data:
+        wave, _, path = item.partition("=") if "=" in item else (Path(item).stem, "", item)
+        waves[wave] = path
+    waves = waves or config_waves(cfg)
+    fmt = args.format or ("xlsx" if args.out.lower().endswith(".xlsx") else "parquet")
+    run_batch(cfg, plan, waves, args.out, fmt=fmt, sectors=args.sector or None, workers=args.workers, chunksize=args.chunksize)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Hashable, Optional
+
+import pandas as pd
+
+_MISSING = object()
+CACHE_VERSION = 2
+
+def cache_key(key: Hashable) -> str:
+    return hashlib.blake2b(repr((CACHE_VERSION, key)).encode("utf-8"), digest_size=16).hexdigest()
+
+def nbytes(value) -> int:
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    return 64
+
+def to_arrow(df: pd.DataFrame):
+    import pyarrow as pa
+    meta = {"object_columns": [i for i, dt in enumerate(df.dtypes) if dt == object], "object_index": df.index.dtype == object}
+    if isinstance(df.columns, pd.CategoricalIndex):
+        meta["columns_categories"] = df.columns.categories.tolist()
+        meta["columns_ordered"] = bool(df.columns.ordered)
+        df = df.set_axis(pd.Index(list(df.columns), dtype=object, name=df.columns.name), axis=1)
+    table = pa.Table.from_pandas(df, preserve_index=True)
+    return table.replace_schema_metadata({**(table.schema.metadata or {}), b"result_cache": json.dumps(meta).encode("utf-8")})
+
+def from_arrow(table) -> pd.DataFrame:
+    meta = json.loads((table.schema.metadata or {}).get(b"result_cache", b"{}"))
+    df = table.to_pandas()
+    for i in meta.get("object_columns", []):
+        df.isetitem(i, df.iloc[:, i].astype(object))
+    if meta.get("object_index") and df.index.dtype != object:
+        df.index = df.index.astype(object)
+    if "columns_categories" in meta:
+        df.columns = pd.CategoricalIndex(df.columns, categories=meta["columns_categories"],
+                                      ordered=meta.get("columns_ordered", False), name=df.columns.name)
+    return df
+
+class ResultCache:
+    def __init__(self, max_bytes: int = 256 * 2**20, spill_dir: Optional[str] = None, spill_max_bytes: int = 2 * 2**30):
+        self.max_bytes = max_bytes
+        self.spill_dir = Path(spill_dir) if spill_dir else None
+        self.spill_max_bytes = spill_max_bytes
+        self._items: "OrderedDict[str, tuple]" = OrderedDict()
+        self._files: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "spills": 0}
+        if self.spill_dir is not None:
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+            prefix = f"v{CACHE_VERSION}-"
+            for p in sorted(self.spill_dir.glob("*.arrow"), key=lambda p: p.stat().st_mtime):
+                if p.stem.startswith(prefix):
+                    self._files[p.stem[len(prefix):]] = p.stat().st_size
+                else:
+                    p.unlink(missing_ok=True)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, key: Hashable) -> bool:
+        h = cache_key(key)
+        return h in self._items or h in self._files
+
+    def _path(self, h: str) -> Path:
+        return self.spill_dir / f"v{CACHE_VERSION}-{h}.arrow"
+
+    def get(self, key: Hashable, default=None):
+        h = cache_key(key)
+        with self._lock:
+            item = self._items.get(h, _MISSING)
+            if item is not _MISSING:
+                self._items.move_to_end(h)
+                self.stats["hits"] += 1
+                return item[0]
+            on_disk = h in self._files
+        value = self._load(h) if on_disk else _MISSING
+        with self._lock:
+            if value is _MISSING:
+                self.stats["misses"] += 1
+                return default
+            self.stats["disk_hits"] += 1
+            self._files.move_to_end(h)
+        self._store(h, value)
+        return value
+
+    def put(self, key: Hashable, value) -> None:
+        self._store(cache_key(key), value)
+
+    def get_or_compute(self, key: Hashable, compute):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def _store(self, h: str, value) -> None:
+        size = nbytes(value)
+        evicted = []
+        with self._lock:
+            old = self._items.pop(h, None)
+            if old is not None:
+                self.bytes -= old[1]
+            if size > self.max_bytes:
+                evicted.append((h, value))
+            else:
+                self._items[h] = (value, size)
+                self.bytes += size
+            while self.bytes > self.max_bytes and self._items:
+                eh, (ev, es) = self._items.popitem(last=False)
+                self.bytes -= es
+                self.stats["evictions"] += 1
+                evicted.append((eh, ev))
+        for eh, ev in evicted:
+            self._spill(eh, ev)
+
+    def _spill(self, h: str, value) -> None:
+        if self.spill_dir is None or not isinstance(value, pd.DataFrame) or h in self._files:
+            return
+        import pyarrow as pa
+        target = self._path(h)
+        tmp = target.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            table = to_arrow(value)
+            pd.testing.assert_frame_equal(from_arrow(table), value)
+            with pa.OSFile(str(tmp), "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+            os.replace(tmp, target)
+        except Exception:
+            tmp.unlink(missing_ok=True)
+            return
+        drop = []
+        with self._lock:
+            self._files[h] = target.stat().st_size
+            self.stats["spills"] += 1
+            while sum(self._files.values()) > self.spill_max_bytes and len(self._files) > 1:
+                drop.append(self._files.popitem(last=False)[0])
+        for dh in drop:
+            self._path(dh).unlink(missing_ok=True)
+
+    def _load(self, h: str):
+        import pyarrow as pa
+        try:
+            with pa.memory_map(str(self._path(h)), "r") as source:
+                return from_arrow(pa.ipc.open_file(source).read_all())
+        except Exception:
+            with self._lock:
+                self._files.pop(h, None)
+            return _MISSING
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self.bytes = 0
+
+    def info(self) -> dict:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["disk_hits"] + self.stats["misses"]
+            return {**self.stats, "entries": len(self._items), "mb": round(self.bytes / 2**20, 2),
+                    "disk_entries": len(self._files), "disk_mb": round(sum(self._files.values()) / 2**20, 2),
+                    "hit_rate": round((self.stats["hits"] + self.stats["disk_hits"]) / lookups, 3) if lookups else None}
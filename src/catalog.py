@@ -0,0 +1,244 @@
+
+import hashlib
+import json
+import os
+import re
+import shutil
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.filters import compile_filter, condition_mask
+from src.io import file_fingerprint, ingest_path, read_data
+
+WAVE_COL = "ronda"
+ROW_COL = "_fila"
+ROW_STRIDE = 2**40
+MAX_PARTITIONS = 256
+
+def wave_name(value) -> str:
+    return re.sub(r"[^\w.-]+", "_", str(value)).strip("_") or "ronda"
+
+def config_waves(cfg: dict) -> Dict[str, str]:
+    waves = cfg.get("waves") or {Path(cfg["data_path"]).stem: cfg["data_path"]}
+    return {wave_name(w): p for w, p in waves.items()}
+
+def catalog_root(cfg: dict) -> str:
+    return cfg.get("catalog_dir") or str(Path(cfg.get("cache_dir") or ".cache") / "catalog")
+
+def _source(path: str, cache_dir: Optional[str]) -> Path:
+    p = Path(path)
+    if p.suffix.lower() == ".parquet":
+        return p
+    read_data(path, columns=[], cache_dir=cache_dir)
+    return ingest_path(p, cache_dir)
+
+def _is_string(typ) -> bool:
+    import pyarrow as pa
+    if pa.types.is_dictionary(typ):
+        typ = typ.value_type
+    return pa.types.is_string(typ) or pa.types.is_large_string(typ)
+
+def _is_number(typ) -> bool:
+    import pyarrow as pa
+    return pa.types.is_integer(typ) or pa.types.is_floating(typ)
+
+def filter_expression(spec: dict, schema, skip: Iterable[str] = ()):
+    return _pushdown(spec, schema, skip)[0]
+
+def _pushdown(spec: dict, schema, skip: Iterable[str] = ()):
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    skip = set(skip)
+    expr, residual = None, []
+    for op, var, arg in compile_filter(spec):
+        if var in skip or var not in schema.names:
+            continue
+        typ, f = schema.field(var).type, ds.field(var)
+        if op == "isnull":
+            e = f.is_null(nan_is_null=True) if arg else ~f.is_null(nan_is_null=True)
+        elif op == "range" and _is_number(typ):
+            lo, hi = (arg.get("min"), arg.get("max")) if isinstance(arg, dict) else (list(arg) + [None, None])[:2]
+            e = f.is_valid()
+            if lo is not None:
+                e &= f >= float(lo)
+            if hi is not None:
+                e &= f <= float(hi)
+        elif op in ("in", "eq"):
+            values = list(arg) if op == "in" else [arg]
+            if _is_number(typ) and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+                e = f.isin([float(v) for v in values] if pa.types.is_floating(typ) else values)
+            elif _is_string(typ) and all(isinstance(v, str) for v in values):
+                e = f.isin(values)
+            else:
+                residual.append((op, var, arg))
+                continue
+        else:
+            residual.append((op, var, arg))
+            continue
+        expr = e if expr is None else expr & e
+    return expr, residual
+
+class Catalog:
+    def __init__(self, root: str, waves: Dict[str, str], key_col: Optional[str] = None, cache_dir: Optional[str] = None,
+                 build: bool = True):
+        self.root = Path(root)
+        self.waves = {wave_name(w): p for w, p in waves.items()}
+        self.order = {w: i for i, w in enumerate(self.waves)}
+        self.key_col = key_col
+        self.cache_dir = cache_dir or str(self.root / "_ingest")
+        self.fingerprints = {w: file_fingerprint(p, self.cache_dir) for w, p in self.waves.items()}
+        self.key = hashlib.blake2b(repr((sorted(self.fingerprints.items()), key_col)).encode(), digest_size=8).hexdigest()
+        if build or not self._load():
+            self._build()
+
+    def _wave_dir(self, wave: str) -> Path:
+        return self.root / f"{WAVE_COL}={wave}"
+
+    def _build(self):
+        import pyarrow.parquet as pq
+        self.root.mkdir(parents=True, exist_ok=True)
+        manifest_path = self.root / "catalog.json"
+        try:
+            manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+        except Exception:
+            manifest = {}
+        schemas = {w: pq.read_schema(_source(p, self.cache_dir)) for w, p in self.waves.items()}
+        self.partitioned = bool(self.key_col) and all(self.key_col in s.names for s in schemas.values())
+        if self.partitioned:
+            for w, p in self.waves.items():
+                keys = pq.read_table(_source(p, self.cache_dir), columns=[self.key_col]).column(0)
+                if len(keys.unique()) > MAX_PARTITIONS:
+                    self.partitioned = False
+                    break
+        layout = {"key_col": self.key_col, "partitioned": self.partitioned}
+        if manifest.get("layout") != layout:
+            manifest = {"layout": layout, "waves": {}}
+        for w, p in self.waves.items():
+            if manifest["waves"].get(w) != self.fingerprints[w] or not self._wave_dir(w).exists():
+                self._write_wave(w, _source(p, self.cache_dir), schemas[w])
+                manifest["waves"][w] = self.fingerprints[w]
+        tmp = manifest_path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(manifest), encoding="utf-8")
+        os.replace(tmp, manifest_path)
+        self._open(schemas)
+
+    def _load(self) -> bool:
+        import pyarrow.parquet as pq
+        try:
+            manifest = json.loads((self.root / "catalog.json").read_text(encoding="utf-8"))
+        except Exception:
+            return False
+        layout = manifest.get("layout") or {}
+        if layout.get("key_col") != self.key_col or any(manifest["waves"].get(w) != fp or not self._wave_dir(w).exists()
+                                                        for w, fp in self.fingerprints.items()):
+            return False
+        self.partitioned = bool(layout.get("partitioned"))
+        self._open({w: pq.read_schema(_source(p, self.cache_dir)) for w, p in self.waves.items()})
+        return True
+
+    def _partitioning(self, schema):
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        fields = [pa.field(WAVE_COL, pa.string())]
+        if self.partitioned:
+            fields.append(schema.field(self.key_col))
+        return ds.partitioning(pa.schema(fields), flavor="hive")
+
+    def _write_wave(self, wave: str, source: Path, schema):
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        import pyarrow.parquet as pq
+        pf = pq.ParquetFile(source, memory_map=True)
+        out_schema = pf.schema_arrow.append(pa.field(ROW_COL, pa.int64()))
+
+        def batches():
+            start = 0
+            for batch in pf.iter_batches(batch_size=100_000):
+                rows = pa.array(np.arange(start, start + batch.num_rows, dtype=np.int64))
+                start += batch.num_rows
+                yield pa.RecordBatch.from_arrays(batch.columns + [rows], schema=out_schema)
+
+        target = self._wave_dir(wave)
+        tmp = self.root / f".tmp-{wave}-{os.getpid()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        partitioning = ds.partitioning(pa.schema([schema.field(self.key_col)]), flavor="hive") if self.partitioned else None
+        ds.write_dataset(batches(), tmp, schema=out_schema, format="parquet", partitioning=partitioning,
+                         max_partitions=MAX_PARTITIONS + 1, existing_data_behavior="overwrite_or_ignore")
+        shutil.rmtree(target, ignore_errors=True)
+        os.replace(tmp, target)
+
+    def _open(self, schemas: Dict[str, object]):
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        seen: Dict[str, None] = {}
+        for s in schemas.values():
+            seen.update(dict.fromkeys(s.names))
+        self.columns = list(seen) + [WAVE_COL]
+        unified = pa.unify_schemas([s.append(pa.field(ROW_COL, pa.int64())) for s in schemas.values()], promote_options="permissive")
+        part = self._partitioning(unified)
+        if self.partitioned:
+            unified = unified.remove(unified.get_field_index(self.key_col))
+        self.schema = pa.unify_schemas([unified, part.schema])
+        files = [str(f) for w in self.waves for f in sorted(self._wave_dir(w).rglob("*.parquet"))]
+        self.dataset = ds.dataset(files, schema=self.schema, format="parquet", partitioning=part, partition_base_dir=str(self.root))
+
+    def sectors(self, waves: Optional[Iterable[str]] = None) -> list:
+        import pyarrow.dataset as ds
+        if not self.partitioned:
+            return []
+        waves = set(waves) if waves else None
+        out = {}
+        for frag in self.dataset.get_fragments():
+            keys = ds.get_partition_keys(frag.partition_expression)
+            if waves is None or keys.get(WAVE_COL) in waves:
+                out[keys.get(self.key_col)] = None
+        return list(out)
+
+    def selection_key(self, waves: Optional[Iterable[str]] = None, sectors: Optional[Iterable] = None) -> str:
+        parts = (self.key, tuple(sorted(waves or [])), tuple(sorted(map(str, sectors))) if sectors is not None else None)
+        return hashlib.blake2b(repr(parts).encode(), digest_size=8).hexdigest()
+
+    def _scan(self, columns: Optional[List[str]], waves: Optional[Iterable[str]], sectors: Optional[Iterable],
+              filter_spec: Optional[dict], skip: Iterable[str]):
+        import pyarrow.dataset as ds
+        expr = ds.field(WAVE_COL).isin(list(waves)) if waves else None
+        if sectors is not None and self.partitioned:
+            sectors = list(sectors)
+            keys = ds.field(self.key_col).isin([s for s in sectors if s is not None])
+            if any(s is None for s in sectors):
+                keys |= ds.field(self.key_col).is_null()
+            expr = keys if expr is None else expr & keys
+        pushed, residual = _pushdown(filter_spec, self.schema, skip=skip) if filter_spec else (None, [])
+        if pushed is not None:
+            expr = pushed if expr is None else expr & pushed
+        wanted = set(self.columns if columns is None else columns) | {WAVE_COL}
+        extra = {var for _, var, _ in residual} - wanted
+        cols = [c for c in self.columns if (c in wanted or c in extra) and c in self.schema.names]
+        return cols + [ROW_COL], expr, residual, sorted(extra)
+
+    def _frame(self, df: pd.DataFrame, residual=(), extra=()) -> pd.DataFrame:
+        wave_pos = df[WAVE_COL].map(self.order).to_numpy(dtype=np.int64)
+        df.index = pd.Index(wave_pos * ROW_STRIDE + df.pop(ROW_COL).to_numpy(dtype=np.int64))
+        if residual:
+            mask = np.ones(len(df), dtype=bool)
+            for op, var, arg in residual:
+                mask &= condition_mask(df, op, var, arg)
+            df = df[mask]
+        return df.drop(columns=list(extra)) if extra else df
+
+    def read(self, columns: Optional[List[str]] = None, waves: Optional[Iterable[str]] = None, sectors: Optional[Iterable] = None,
+             filter_spec: Optional[dict] = None, skip: Iterable[str] = ()) -> pd.DataFrame:
+        cols, expr, residual, extra = self._scan(columns, waves, sectors, filter_spec, skip)
+        return self._frame(self.dataset.to_table(columns=cols, filter=expr).to_pandas(), residual, extra).sort_index()
+
+    def iter_read(self, columns: Optional[List[str]] = None, waves: Optional[Iterable[str]] = None, sectors: Optional[Iterable] = None,
+                  filter_spec: Optional[dict] = None, skip: Iterable[str] = (), batch_size: int = 100_000) -> Iterator[pd.DataFrame]:
+        cols, expr, residual, extra = self._scan(columns, waves, sectors, filter_spec, skip)
+        for batch in self.dataset.to_batches(columns=cols, filter=expr, batch_size=batch_size):
+            if batch.num_rows:
+                frame = self._frame(batch.to_pandas(), residual, extra)
+                if len(frame):
+                    yield frame
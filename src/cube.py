@@ -0,0 +1,123 @@
+
+from typing import Callable, Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.filters import apply_block_filter
+from src.tables import (count_key, merge_category_order, crosstab_from_counts, freq_from_counts,
+                        resolve_categories, summary_from_counts)
+
+def _cube_key(df: pd.DataFrame, by: str) -> pd.Series:
+    s = df[by] if by in df.columns else pd.Series(np.nan, index=df.index, name=by)
+    return s.astype(object)
+
+def _counts(keys: list, weight: Optional[pd.Series]) -> pd.DataFrame:
+    frame = pd.DataFrame({f"k{i}": k.to_numpy() for i, k in enumerate(keys)})
+    frame["w"] = weight.to_numpy() if weight is not None else 0.0
+    g = frame.groupby(list(frame.columns[:-1]), dropna=False, sort=True)["w"]
+    return pd.DataFrame({"n": g.size(), "w": g.sum()})
+
+def _table_entry(dblock: pd.DataFrame, by: str, table: Tuple, weight: Optional[str]) -> Optional[dict]:
+    if table[0] == "summary":
+        var = table[1]
+        if var not in dblock.columns:
+            return None
+        s = pd.to_numeric(dblock[var], errors="coerce")
+        keep = s.notna()
+        wser = pd.to_numeric(dblock.loc[keep, weight], errors="coerce").fillna(0) if weight and weight in dblock.columns else None
+        counts = _counts([_cube_key(dblock, by)[keep], s[keep]], wser)
+        return {"counts": counts, "orders": [None], "full": [False], "ordered": [False], "weighted": wser is not None}
+    w = table[3] if table[0] == "crosstab" and table[3] else weight
+    cols = [table[1]] if table[0] == "freq" else [table[1], table[2]]
+    if any(c not in dblock.columns for c in cols):
+        return None
+    x = dblock[list(dict.fromkeys([c for c in (by, *cols, w) if c and c in dblock.columns]))].dropna(subset=cols)
+    wser = x[w] if w and w in x.columns else None
+    keys, orders, full, ordered = [_cube_key(x, by)], [], [], []
+    for c in cols:
+        k, cats, is_bin, is_ordered = count_key(x[c], binned=table[0] == "crosstab")
+        keys.append(k.astype(object))
+        orders.append(cats)
+        full.append(is_bin)
+        ordered.append(is_ordered)
+    return {"counts": _counts(keys, wser), "orders": orders, "full": full, "ordered": ordered, "weighted": wser is not None}
+
+def build_cube(df: pd.DataFrame, by: str, plan: dict, weight: Optional[str] = None, fkeys: Optional[Iterable[str]] = None) -> dict:
+    cube = {"by": by, "weight": weight, "rows": {}, "tables": {}}
+    for fkey in plan["filters"] if fkeys is None else fkeys:
+        spec = plan["filters"][fkey]
+        dblock = apply_block_filter(df, spec)
+        cube["rows"][fkey] = _cube_key(dblock, by).value_counts(dropna=False)
+        for table in plan["nodes"].get(fkey, []):
+            entry = _table_entry(dblock, by, table, weight)
+            if entry is not None:
+                cube["tables"][(fkey, table)] = entry
+    return cube
+
+def merge_cubes(a: Optional[dict], b: dict) -> dict:
+    if a is None:
+        return b
+    for fkey, rows in b["rows"].items():
+        a["rows"][fkey] = a["rows"][fkey].add(rows, fill_value=0).astype("int64") if fkey in a["rows"] else rows
+    for key, entry in b["tables"].items():
+        cur = a["tables"].get(key)
+        if cur is None:
+            a["tables"][key] = entry
+            continue
+        cur["counts"] = cur["counts"].add(entry["counts"], fill_value=0)
+        cur["counts"]["n"] = cur["counts"]["n"].astype("int64")
+        cur["orders"] = [merge_category_order(o1, o2) for o1, o2 in zip(cur["orders"], entry["orders"])]
+        cur["full"] = [f1 or f2 for f1, f2 in zip(cur["full"], entry["full"])]
+        cur["ordered"] = [o1 or o2 for o1, o2 in zip(cur["ordered"], entry["ordered"])]
+        cur["weighted"] = cur["weighted"] or entry["weighted"]
+    return a
+
+def build_cube_chunked(chunks: Iterable[pd.DataFrame], by: str, plan: dict, weight: Optional[str] = None,
+                       prepare: Optional[Callable[[pd.DataFrame], pd.DataFrame]] = None, fkeys: Optional[Iterable[str]] = None) -> dict:
+    cube = None
+    for chunk in chunks:
+        if prepare is not None:
+            chunk = prepare(chunk)
+        cube = merge_cubes(cube, build_cube(chunk, by, plan, weight=weight, fkeys=fkeys))
+    return cube if cube is not None else {"by": by, "weight": weight, "rows": {}, "tables": {}}
+
+def cube_groups(cube: dict) -> list:
+    seen = {}
+    for rows in cube["rows"].values():
+        for v in rows.index:
+            if not pd.isna(v):
+                seen[v] = None
+    return list(seen)
+
+def _slice(counts: pd.DataFrame, selected: Optional[Iterable]) -> pd.DataFrame:
+    if selected:
+        counts = counts[counts.index.get_level_values(0).isin(list(selected))]
+    levels = list(range(1, counts.index.nlevels))
+    return counts.groupby(level=levels, sort=True).sum()
+
+def block_rows(cube: dict, fkey: str, selected: Optional[Iterable] = None) -> int:
+    rows = cube["rows"].get(fkey)
+    if rows is None:
+        return 0
+    if selected:
+        rows = rows[rows.index.isin(list(selected))]
+    return int(rows.sum())
+
+def cube_table(cube: dict, fkey: str, table: Tuple, selected: Optional[Iterable] = None) -> Optional[pd.DataFrame]:
+    entry = cube["tables"].get((fkey, table))
+    if entry is None:
+        return None
+    part = _slice(entry["counts"], selected)
+    part = part[part["n"] > 0]
+    s = part["w" if entry["weighted"] else "n"]
+    if table[0] == "summary":
+        return summary_from_counts(s)
+    if table[0] == "freq":
+        if entry["orders"][0] is not None:
+            s.index = pd.CategoricalIndex(s.index, categories=entry["orders"][0], ordered=entry["ordered"][0], name=table[1])
+        return freq_from_counts(s, table[1])
+    if s.empty:
+        return pd.DataFrame()
+    cats = resolve_categories(s.index, entry["orders"], entry["full"], entry["weighted"])
+    return crosstab_from_counts(s, table[1], table[2], row_categories=cats[0], col_categories=cats[1], ordered=tuple(entry["ordered"]))
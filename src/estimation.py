@@ -0,0 +1,268 @@
+
+import hashlib
+from statistics import NormalDist
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.indicators import indicator_masks
+from src.tables import binned_frame
+
+REPLICATE_MAX_MB = 512
+REPLICATE_CHUNK = 2**22
+
+def replicate_mb(n_rows: int, replicates: int) -> float:
+    return n_rows * replicates * np.dtype(np.float32).itemsize / 2**20
+
+class ReplicateDesign:
+    def __init__(self, index: pd.Index, weights: np.ndarray, replicates: np.ndarray, scale: float,
+                 conf_level: float = 0.95, weighted: bool = False, key: str = "", quantiles: Tuple[float, ...] = (0.5,),
+                 rows: Optional[np.ndarray] = None, factor: Optional[np.ndarray] = None):
+        self.index = index
+        self.weights = weights
+        self.replicates = replicates
+        self.scale = scale
+        self.conf_level = conf_level
+        self.weighted = weighted
+        self.key = key
+        self.quantiles = tuple(quantiles)
+        self.rows = np.arange(len(index)) if rows is None else rows
+        self.factor = factor
+        self.z = NormalDist().inv_cdf(0.5 + conf_level / 2)
+
+    def _with(self, index: pd.Index, weights: np.ndarray, rows: np.ndarray, factor: Optional[np.ndarray],
+              weighted: Optional[bool] = None) -> "ReplicateDesign":
+        return ReplicateDesign(index, weights, self.replicates, self.scale, self.conf_level,
+                               self.weighted if weighted is None else weighted, self.key, self.quantiles, rows, factor)
+
+    def take(self, pos: np.ndarray) -> "ReplicateDesign":
+        return self._with(self.index[pos], self.weights[pos], self.rows[pos], None if self.factor is None else self.factor[pos])
+
+    def subset(self, index: pd.Index) -> "ReplicateDesign":
+        if index.equals(self.index):
+            return self
+        pos = self.index.get_indexer(index)
+        if (pos < 0).any():
+            raise ValueError("Hay filas fuera del diseño de réplicas.")
+        return self.take(pos)
+
+    def reweight(self, w: pd.Series) -> "ReplicateDesign":
+        w = pd.to_numeric(w, errors="coerce").fillna(0).to_numpy(dtype="float64")
+        ratio = np.divide(w, self.weights, out=np.zeros_like(w), where=self.weights != 0)
+        return self._with(self.index, w, self.rows, ratio if self.factor is None else ratio * self.factor, weighted=True)
+
+    def _block(self, pos: np.ndarray, cols: slice = slice(None)) -> np.ndarray:
+        block = self.replicates[self.rows[pos], cols].astype(np.float64)
+        if self.factor is not None:
+            block *= self.factor[pos, None]
+        return block
+
+    def _steps(self, n: int, width: int):
+        step = max(1, REPLICATE_CHUNK // max(width, 1))
+        for i in range(0, n, step):
+            yield np.arange(i, min(i + step, n))
+
+    def totals(self, codes: np.ndarray, k: int) -> np.ndarray:
+        out = np.zeros((k, self.replicates.shape[1]))
+        for pos in self._steps(len(self.rows), self.replicates.shape[1]):
+            pos = pos[codes[pos] >= 0]
+            out += group_totals(codes[pos], k, self._block(pos))
+        return out
+
+    def dot(self, values: np.ndarray) -> np.ndarray:
+        out = np.zeros((values.shape[1], self.replicates.shape[1]))
+        for pos in self._steps(len(self.rows), self.replicates.shape[1]):
+            out += values[pos].T.astype(np.float64) @ self._block(pos)
+        return out
+
+    def column_blocks(self):
+        step = max(1, REPLICATE_CHUNK // max(len(self.rows), 1))
+        all_rows = np.arange(len(self.rows))
+        for j in range(0, self.replicates.shape[1], step):
+            yield self._block(all_rows, slice(j, j + step))
+
+    def interval(self, theta: np.ndarray, reps: np.ndarray):
+        dev = reps - theta[..., None]
+        se = np.sqrt(self.scale * np.nansum(dev ** 2, axis=-1))
+        return se, theta - self.z * se, theta + self.z * se
+
+def _bootstrap_multipliers(psu: np.ndarray, strata: np.ndarray, replicates: int, rng: np.random.Generator) -> np.ndarray:
+    n_psu = int(psu.max()) + 1 if len(psu) else 0
+    psu_stratum = np.zeros(n_psu, dtype=np.int64)
+    psu_stratum[psu] = strata
+    mult = np.ones((n_psu, replicates), dtype=np.float32)
+    for h in np.unique(psu_stratum):
+        members = np.flatnonzero(psu_stratum == h)
+        n_h = len(members)
+        if n_h < 2:
+            continue
+        draws = rng.multinomial(n_h - 1, np.full(n_h, 1.0 / n_h), size=replicates)
+        mult[members] = draws.T * np.float32(n_h / (n_h - 1))
+    return mult[psu]
+
+def build_design(df: pd.DataFrame, weight: Optional[str] = None, replicates: int = 100, seed: int = 0,
+                 strata: Optional[str] = None, cluster: Optional[str] = None, replicate_cols: Optional[List[str]] = None,
+                 scale: Optional[float] = None, conf_level: float = 0.95, key: str = "",
+                 max_mb: float = REPLICATE_MAX_MB, quantiles: Tuple[float, ...] = (0.5,)) -> ReplicateDesign:
+    n_reps = len(replicate_cols) if replicate_cols else replicates
+    if max_mb and replicate_mb(len(df), n_reps) > max_mb:
+        raise MemoryError(f"La matriz de réplicas ({len(df):,} × {n_reps}) ocuparía {replicate_mb(len(df), n_reps):,.0f} MB, "
+                          f"por encima de variance.max_mb = {max_mb:,.0f} MB. Reduzca variance.replicates o filtre la muestra.")
+    weighted = bool(weight and weight in df.columns)
+    w = pd.to_numeric(df[weight], errors="coerce").fillna(0).to_numpy(dtype="float64") if weighted else np.ones(len(df))
+    if replicate_cols:
+        reps = df[replicate_cols].apply(pd.to_numeric, errors="coerce").fillna(0).to_numpy(dtype=np.float32)
+    else:
+        psu = pd.factorize(df[cluster])[0] if cluster and cluster in df.columns else np.arange(len(df))
+        psu = np.where(psu < 0, psu.max() + 1, psu)
+        st_codes = pd.factorize(df[strata])[0] if strata and strata in df.columns else np.zeros(len(df), dtype=np.int64)
+        mult = _bootstrap_multipliers(psu, st_codes, replicates, np.random.default_rng(seed))
+        reps = mult
+        reps *= w[:, None].astype(np.float32)
+    n_reps = reps.shape[1]
+    scale = float(scale) if scale is not None else 1.0 / max(n_reps - 1, 1)
+    return ReplicateDesign(df.index, w, reps, scale, conf_level=conf_level, weighted=weighted, key=key, quantiles=quantiles)
+
+def variance_columns(cfg: dict, columns: List[str]) -> List[str]:
+    var = (cfg or {}).get("variance") or {}
+    out = [var.get("strata_col"), var.get("cluster_col")]
+    prefix = var.get("replicate_prefix")
+    if prefix:
+        out.extend(c for c in columns if str(c).startswith(prefix))
+    return [c for c in out if c]
+
+def design_from_config(df: pd.DataFrame, cfg: dict, key: str = "") -> ReplicateDesign:
+    var = cfg.get("variance") or {}
+    prefix = var.get("replicate_prefix")
+    rep_cols = [c for c in df.columns if str(c).startswith(prefix)] if prefix else None
+    digest = hashlib.blake2b(repr((key, cfg.get("weight_col"), sorted(var.items()))).encode(), digest_size=8).hexdigest()
+    return build_design(df, weight=cfg.get("weight_col"), replicates=int(var.get("replicates", 100)),
+                        seed=int(var.get("seed", 0)), strata=var.get("strata_col"), cluster=var.get("cluster_col"),
+                        replicate_cols=rep_cols or None, scale=var.get("scale"),
+                        conf_level=float(var.get("conf_level", 0.95)), key=digest,
+                        max_mb=float(var.get("max_mb", REPLICATE_MAX_MB) or 0),
+                        quantiles=tuple(float(q) for q in var.get("quantiles") or (0.5,)))
+
+def group_totals(codes: np.ndarray, k: int, values: np.ndarray) -> np.ndarray:
+    if values.ndim == 1:
+        return np.bincount(codes, weights=values, minlength=k)
+    out = np.zeros((k, values.shape[1]), dtype=values.dtype)
+    if len(codes) == 0:
+        return out
+    order = np.argsort(codes, kind="stable")
+    sorted_codes = codes[order]
+    present = np.unique(sorted_codes)
+    starts = np.searchsorted(sorted_codes, present)
+    out[present] = np.add.reduceat(values[order], starts, axis=0)
+    return out
+
+def _factorize(s: pd.Series):
+    try:
+        return pd.factorize(s, sort=True)
+    except TypeError:
+        return pd.factorize(s)
+
+def _ratio(num: np.ndarray, den: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(den != 0, num / den, np.nan)
+
+def _pct_columns(out: pd.DataFrame, design: ReplicateDesign, theta: np.ndarray, reps: np.ndarray) -> pd.DataFrame:
+    se, lo, hi = design.interval(theta, reps)
+    out["%"] = np.round(100 * theta, 2)
+    out["EE"] = np.round(100 * se, 2)
+    out["IC inf"] = np.round(np.clip(100 * lo, 0, 100), 2)
+    out["IC sup"] = np.round(np.clip(100 * hi, 0, 100), 2)
+    return out
+
+def estimate_freq(df: pd.DataFrame, var: str, design: ReplicateDesign) -> pd.DataFrame:
+    if var not in df.columns or df.empty:
+        return pd.DataFrame({var: [], "n": [], "%": [], "EE": [], "IC inf": [], "IC sup": []})
+    sub = design.subset(df.index)
+    codes, uniques = pd.factorize(df[var])
+    keep = codes >= 0
+    totals = group_totals(codes[keep], len(uniques), sub.weights[keep])
+    reps = sub.totals(codes, len(uniques))
+    theta = _ratio(totals, totals.sum())
+    out = pd.DataFrame({var: np.asarray(uniques, dtype=object),
+                        "n": totals if sub.weighted else totals.astype("int64")})
+    out = _pct_columns(out, sub, theta, _ratio(reps, reps.sum(axis=0)))
+    return out.sort_values("n", ascending=False, kind="stable").reset_index(drop=True)
+
+def estimate_crosstab(df: pd.DataFrame, row: str, col: str, design: ReplicateDesign, weight: Optional[str] = None) -> pd.DataFrame:
+    if row not in df.columns or col not in df.columns or df.empty:
+        return pd.DataFrame()
+    x = binned_frame(df, row, col, extra=[weight])
+    if x.empty:
+        return pd.DataFrame()
+    sub = design.subset(x.index)
+    if weight and weight in x.columns:
+        sub = sub.reweight(x[weight])
+    rc, ru = _factorize(x[row])
+    cc, cu = _factorize(x[col])
+    kr, kc = len(ru), len(cu)
+    codes = rc * kc + cc
+    totals = group_totals(codes, kr * kc, sub.weights).reshape(kr, kc)
+    reps = sub.totals(codes, kr * kc).reshape(kr, kc, -1)
+    theta = _ratio(totals, totals.sum(axis=1, keepdims=True))
+    rep_pct = _ratio(reps, reps.sum(axis=1, keepdims=True))
+    out = pd.DataFrame({row: np.repeat(np.asarray(ru, dtype=object), kc), col: np.tile(np.asarray(cu, dtype=object), kr)})
+    out = _pct_columns(out, sub, theta.ravel(), rep_pct.reshape(kr * kc, -1))
+    return out[np.repeat(totals.sum(axis=1) > 0, kc)].reset_index(drop=True)
+
+def quantile_name(q: float) -> str:
+    return "median" if q == 0.5 else f"p{100 * q:g}"
+
+def _replicate_quantiles(values: np.ndarray, weights: np.ndarray, quantiles: Tuple[float, ...]) -> np.ndarray:
+    cum = np.cumsum(weights, axis=0)
+    last = len(values) - 1
+    out = []
+    for q in quantiles:
+        target = cum[-1] * q
+        lo = np.minimum((cum >= target).argmax(axis=0), last)
+        hi = np.where((cum > target).any(axis=0), (cum > target).argmax(axis=0), last)
+        out.append((values[lo] + values[hi]) / 2)
+    return np.asarray(out)
+
+def estimate_summary(df: pd.DataFrame, var: str, design: ReplicateDesign) -> pd.DataFrame:
+    empty = pd.DataFrame({"stat": [], "value": [], "EE": [], "IC inf": [], "IC sup": []})
+    if var not in df.columns or df.empty:
+        return empty
+    s = pd.to_numeric(df[var], errors="coerce")
+    keep = np.flatnonzero(s.notna().to_numpy())
+    if len(keep) == 0:
+        return empty
+    x = s.to_numpy(dtype="float64")[keep]
+    order = np.argsort(x, kind="stable")
+    sub = design.subset(df.index).take(keep[order])
+    xs, w, qs = x[order], sub.weights, sub.quantiles
+    mean = _ratio(np.array([xs @ w]), np.array([w.sum()]))
+    sums = sub.dot(np.column_stack([xs, np.ones_like(xs)]))
+    rep_mean = _ratio(sums[0], sums[1])[None, :]
+    quant = _replicate_quantiles(xs, w[:, None], qs)[:, 0]
+    rep_quant = np.concatenate([_replicate_quantiles(xs, block, qs) for block in sub.column_blocks()], axis=1)
+    theta = np.concatenate([mean, quant])
+    se, lo, hi = sub.interval(theta, np.concatenate([rep_mean, rep_quant]))
+    return pd.DataFrame({"stat": ["mean"] + [quantile_name(q) for q in qs], "value": np.round(theta, 3), "EE": np.round(se, 3),
+                         "IC inf": np.round(lo, 3), "IC sup": np.round(hi, 3)})
+
+def estimate_indicators(df: pd.DataFrame, plan: List[dict], design: ReplicateDesign) -> pd.DataFrame:
+    masks = indicator_masks(df, plan)
+    if masks.empty or len(masks.columns) == 0:
+        return pd.DataFrame({"indicador": [], "%": [], "EE": [], "IC inf": [], "IC sup": []})
+    sub = design.subset(df.index)
+    m = masks.to_numpy(dtype=np.float64)
+    theta = _ratio(m.T @ sub.weights, sub.weights.sum())
+    sums = sub.dot(np.column_stack([m, np.ones(len(m))]))
+    reps = _ratio(sums[:-1], sums[-1])
+    out = pd.DataFrame({"indicador": list(masks.columns)})
+    return _pct_columns(out, sub, theta, reps)
+
+def estimate_table(df: pd.DataFrame, table: Tuple, design: ReplicateDesign) -> Optional[pd.DataFrame]:
+    if table[0] == "freq":
+        return estimate_freq(df, table[1], design) if table[1] in df.columns else None
+    if table[0] == "crosstab":
+        if table[1] not in df.columns or table[2] not in df.columns:
+            return None
+        return estimate_crosstab(df, table[1], table[2], design, weight=table[3])
+    return estimate_summary(df, table[1], design) if table[1] in df.columns else None
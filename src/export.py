@@ -0,0 +1,202 @@
+
+import datetime as dt
+import io
+import json
+import os
+import re
+import zipfile
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.plan import table_columns
+
+EXPORT_FORMATS = {"xlsx": "Excel (xlsx)", "parquet": "Parquet", "arrow": "Arrow IPC"}
+EXPORT_MIME = {"xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+               "parquet": "application/zip", "arrow": "application/zip"}
+EXPORT_SUFFIX = {"xlsx": ".xlsx", "parquet": ".zip", "arrow": ".zip"}
+
+def _label(var_labels: dict, key) -> str:
+    s = str(var_labels.get(key, key))
+    return str(key) if s.lower() == "nan" else s
+
+def table_title(table: Tuple, var_labels: dict) -> str:
+    if table[0] == "freq":
+        return f"Frecuencia: {_label(var_labels, table[1])}"
+    if table[0] == "crosstab":
+        return f"Crosstab: {_label(var_labels, table[1])} × {_label(var_labels, table[2])}"
+    return f"Resumen: {_label(var_labels, table[1])}"
+
+def _sheet_name(name: str, used: set) -> str:
+    base = re.sub(r"[\[\]:*?/\\]", "-", str(name)).strip()[:31] or "Bloque"
+    out, i = base, 1
+    while out in used:
+        i += 1
+        suffix = f" ({i})"
+        out = base[:31 - len(suffix)] + suffix
+    used.add(out)
+    return out
+
+def _flat(res: pd.DataFrame, table: Tuple) -> pd.DataFrame:
+    out = res.reset_index() if table[0] == "crosstab" else res.reset_index(drop=True)
+    out.columns = [str(c) for c in out.columns]
+    return out
+
+def safe_part(value) -> str:
+    return re.sub(r"[^\w.-]+", "_", str(value)).strip("_") or "na"
+
+def table_variables(table: Tuple, columns: Iterable[str] = ()) -> List[str]:
+    return list(dict.fromkeys([v for v in table_columns(table) if isinstance(v, str)] + list(columns)))
+
+def label_metadata(variables: Iterable[str], var_labels: Optional[dict] = None, val_labels: Optional[Dict[str, Dict]] = None) -> dict:
+    var_labels, val_labels = var_labels or {}, val_labels or {}
+    return {"var_labels": {v: _label(var_labels, v) for v in variables if v in var_labels},
+            "value_labels": {v: {str(k): str(lab) for k, lab in val_labels[v].items()} for v in variables if v in val_labels}}
+
+def _stringify(out: pd.DataFrame) -> pd.DataFrame:
+    out = out.copy()
+    for c in out.columns:
+        if out[c].dtype == object or isinstance(out[c].dtype, pd.CategoricalDtype):
+            s = out[c].astype(object)
+            out[c] = s.astype(str).where(s.notna(), None)
+    return out
+
+def table_to_arrow(res: pd.DataFrame, table: Tuple, title: Optional[str] = None, var_labels: Optional[dict] = None,
+                   val_labels: Optional[Dict[str, Dict]] = None, context: Optional[dict] = None):
+    import pyarrow as pa
+    out = _flat(res, table)
+    try:
+        at = pa.Table.from_pandas(out, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        at = pa.Table.from_pandas(_stringify(out), preserve_index=False)
+    var_labels = var_labels or {}
+    fields = [f.with_metadata({b"label": _label(var_labels, f.name).encode("utf-8")}) if f.name in var_labels else f for f in at.schema]
+    meta = {"title": title, "table": list(table), **(context or {}), **label_metadata(table_variables(table, out.columns), var_labels, val_labels)}
+    schema = pa.schema(fields, metadata={**(at.schema.metadata or {}), b"tabulado": json.dumps(meta, ensure_ascii=False, default=str).encode("utf-8")})
+    return pa.Table.from_arrays(at.columns, schema=schema)
+
+def _prepare_target(path):
+    if isinstance(path, (str, Path)):
+        parent = Path(path).parent
+        parent.mkdir(parents=True, exist_ok=True)
+        if not os.access(parent, os.W_OK):
+            raise PermissionError(f"No se puede escribir en {parent}")
+
+def _cell(value):
+    if value is None or isinstance(value, (str, bool, int)):
+        return value
+    if isinstance(value, np.generic):
+        value = value.item()
+    try:
+        if pd.isna(value):
+            return None
+    except (TypeError, ValueError):
+        pass
+    return value if isinstance(value, (bool, int, float, dt.date)) else str(value)
+
+class XlsxSink:
+    def __init__(self, path, blocks: Dict[int, str], var_labels: Optional[dict] = None, val_labels: Optional[Dict[str, Dict]] = None):
+        from openpyxl import Workbook
+        _prepare_target(path)
+        self.path = path
+        self.book = Workbook(write_only=True)
+        self.used: set = set()
+        self.sheets = {i: self.book.create_sheet(_sheet_name(name, self.used)) for i, name in blocks.items()}
+        self.var_labels, self.val_labels = var_labels or {}, val_labels or {}
+        self.variables: Dict[str, None] = {}
+
+    def _header(self, ws, values) -> list:
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Font
+        cells = []
+        for v in values:
+            cell = WriteOnlyCell(ws, value=_cell(v))
+            cell.font = Font(bold=True)
+            cells.append(cell)
+        return cells
+
+    def write(self, wave, sector, block_idx, block_name, n, tables):
+        ws = self.sheets[block_idx]
+        ws.append(self._header(ws, [block_name]))
+        ws.append([f"Ronda: {wave} | Sector: {sector} | n = {n:,}"])
+        ws.append([])
+        for title, table, res in tables:
+            out = _flat(res, table)
+            self.variables.update(dict.fromkeys(table_variables(table, out.columns)))
+            ws.append(self._header(ws, [title]))
+            ws.append(self._header(ws, out.columns))
+            for row in out.itertuples(index=False, name=None):
+                ws.append([_cell(v) for v in row])
+            ws.append([])
+            ws.append([])
+
+    def close(self):
+        meta = label_metadata(self.variables, self.var_labels, self.val_labels)
+        if meta["var_labels"] or meta["value_labels"]:
+            ws = self.book.create_sheet(_sheet_name("Etiquetas", self.used))
+            ws.append(self._header(ws, ["Variable", "Etiqueta", "Valor", "Etiqueta del valor"]))
+            for var in self.variables:
+                label = meta["var_labels"].get(var)
+                codes = meta["value_labels"].get(var, {})
+                if label is None and not codes:
+                    continue
+                ws.append([var, label, None, None])
+                for code, value_label in codes.items():
+                    ws.append([var, label, code, value_label])
+        self.book.save(self.path)
+
+class ArrowSink:
+    suffix = ".arrow"
+
+    def __init__(self, path, blocks: Dict[int, str], var_labels: Optional[dict] = None, val_labels: Optional[Dict[str, Dict]] = None):
+        self.var_labels, self.val_labels = var_labels or {}, val_labels or {}
+        archive = not isinstance(path, (str, Path)) or str(path).lower().endswith(".zip")
+        if archive:
+            _prepare_target(path)
+        self.zip = zipfile.ZipFile(path, "w", compression=zipfile.ZIP_STORED) if archive else None
+        self.root = None if archive else Path(path)
+
+    def _write_table(self, at, sink):
+        import pyarrow as pa
+        with pa.ipc.new_file(sink, at.schema) as writer:
+            writer.write_table(at)
+
+    def write(self, wave, sector, block_idx, block_name, n, tables):
+        part = f"wave={safe_part(wave)}/sector={safe_part(sector)}/block={block_idx:02d}"
+        context = {"wave": wave, "sector": sector, "block": block_name, "n": n}
+        for i, (title, table, res) in enumerate(tables):
+            at = table_to_arrow(res, table, title, self.var_labels, self.val_labels, context)
+            name = f"{part}/table_{i:03d}{self.suffix}"
+            if self.zip is not None:
+                with self.zip.open(name, "w") as f:
+                    self._write_table(at, f)
+            else:
+                target = self.root / name
+                target.parent.mkdir(parents=True, exist_ok=True)
+                self._write_table(at, str(target))
+
+    def close(self):
+        if self.zip is not None:
+            self.zip.close()
+
+class ParquetSink(ArrowSink):
+    suffix = ".parquet"
+
+    def _write_table(self, at, sink):
+        import pyarrow.parquet as pq
+        pq.write_table(at, sink)
+
+SINKS = {"xlsx": XlsxSink, "parquet": ParquetSink, "arrow": ArrowSink}
+
+def export_bytes(sections: Iterable[tuple], fmt: str, blocks: Dict[int, str], var_labels: Optional[dict] = None,
+                 val_labels: Optional[Dict[str, Dict]] = None) -> bytes:
+    buf = io.BytesIO()
+    sink = SINKS[fmt](buf, blocks, var_labels, val_labels)
+    try:
+        for section in sections:
+            sink.write(*section)
+    finally:
+        sink.close()
+    return buf.getvalue()
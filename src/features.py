@@ -1,23 +1,84 @@
 
 import pandas as pd
+from typing import Callable, Dict, Iterable, List, Optional
 
 CANDIDATE_JEFE_SEXO = [
     "sexo_jefatura", "sexo_jefe", "jefe_sexo", "sexo_jefehogar",
     "sexo_jefatura_hogar", "p010_sexo_jefatura", "p010_sexo_jefe"
 ]
 
-def derive_sexo_jefatura(df: pd.DataFrame) -> pd.Series:
+FEATURES: Dict[str, dict] = {}
+
+def register_feature(name: str, requires: Callable[[List[str]], List[str]], label: Optional[str] = None):
+    def wrap(func):
+        FEATURES[name] = {"func": func, "requires": requires, "label": label or name}
+        return func
+    return wrap
+
+def sexo_jefatura_source(columns) -> Optional[str]:
+    columns = list(columns)
     for c in CANDIDATE_JEFE_SEXO:
-        if c in df.columns:
-            return df[c]
-    for c in df.columns:
+        if c in columns:
+            return c
+    for c in columns:
         lc = str(c).lower()
         if "jef" in lc and "sexo" in lc:
-            return df[c]
+            return c
+    return None
+
+@register_feature("sexo_jefatura", requires=lambda cols: [s for s in [sexo_jefatura_source(cols)] if s], label="Sexo de la jefatura")
+def derive_sexo_jefatura(df: pd.DataFrame) -> pd.Series:
+    src = sexo_jefatura_source(df.columns)
+    if src is not None:
+        return df[src]
     return pd.Series([None]*len(df), index=df.index, dtype="object")
 
-def apply_all(df: pd.DataFrame) -> pd.DataFrame:
-    out = df.copy()
-    if "sexo_jefatura" not in out.columns:
-        out["sexo_jefatura"] = derive_sexo_jefatura(out)
+def derive_fuera_de_sector(df: pd.DataFrame, sector_col: str, polygon_col: str = "poligono") -> pd.Series:
+    if sector_col not in df.columns or polygon_col not in df.columns:
+        return pd.Series(pd.NA, index=df.index, dtype="boolean")
+    known = df[polygon_col].notna() & df[sector_col].notna()
+    out = (df[polygon_col].astype(str) != df[sector_col].astype(str)).astype("boolean")
+    return out.where(known)
+
+def resolve_features(names: Iterable[str], columns) -> List[str]:
+    columns = set(columns)
+    order: List[str] = []
+    def visit(name: str):
+        if name in order or name in columns or name not in FEATURES:
+            return
+        for dep in FEATURES[name]["requires"](list(columns)):
+            visit(dep)
+        order.append(name)
+    for name in names:
+        visit(name)
+    return order
+
+def feature_labels() -> Dict[str, str]:
+    return {name: spec["label"] for name, spec in FEATURES.items()}
+
+def available_features(columns) -> List[str]:
+    return [n for n in FEATURES if n not in set(columns)]
+
+def feature_columns(columns, names: Optional[Iterable[str]] = None) -> List[str]:
+    columns = list(columns)
+    out = []
+    for name in FEATURES if names is None else names:
+        if name in columns:
+            out.append(name)
+        elif name in FEATURES:
+            for dep in FEATURES[name]["requires"](columns):
+                out.extend(feature_columns(columns, [dep]) if dep in FEATURES and dep not in columns else [dep])
+    return list(dict.fromkeys(out))
+
+def attach_features(df: pd.DataFrame, names: Iterable[str], memo: Optional[Callable] = None) -> pd.DataFrame:
+    todo = resolve_features(names, df.columns)
+    if not todo:
+        return df
+    out = df.copy(deep=False)
+    for name in todo:
+        compute = (lambda f=FEATURES[name]["func"]: f(out))
+        out[name] = memo(name, compute) if memo is not None else compute()
     return out
+
+def apply_all(df: pd.DataFrame) -> pd.DataFrame:
+    return attach_features(df, FEATURES)
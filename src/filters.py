@@ -0,0 +1,91 @@
+
+import json
+import threading
+from collections import OrderedDict
+from typing import Hashable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+OPERATORS = ("in", "in_text", "eq", "not_in", "range", "isnull")
+
+def compile_filter(spec: dict) -> List[Tuple[str, str, object]]:
+    conds = []
+    for op in OPERATORS:
+        for var, arg in ((spec or {}).get(op) or {}).items():
+            conds.append((op, var, arg))
+    return conds
+
+def _arg_key(arg) -> str:
+    return json.dumps(arg, sort_keys=True, ensure_ascii=False, default=str)
+
+def _by_distinct(s: pd.Series, test) -> np.ndarray:
+    codes, uniques = pd.factorize(s, use_na_sentinel=True)
+    hits = np.fromiter((bool(test(u)) for u in uniques), dtype=bool, count=len(uniques))
+    return np.append(hits, bool(test(np.nan)))[codes]
+
+def _bounds(arg):
+    if isinstance(arg, dict):
+        return arg.get("min"), arg.get("max")
+    lo, hi = (list(arg) + [None, None])[:2]
+    return lo, hi
+
+def condition_mask(df: pd.DataFrame, op: str, var: str, arg) -> np.ndarray:
+    s = df[var]
+    if op in ("in", "not_in"):
+        m = s.isin(list(arg)).to_numpy()
+        return ~m if op == "not_in" else m
+    if op == "in_text":
+        vals = [str(v).lower() for v in arg]
+        return _by_distinct(s, lambda x: any(v in str(x).lower() for v in vals))
+    if op == "eq":
+        return (s == arg).to_numpy(dtype=bool, na_value=False)
+    if op == "range":
+        lo, hi = _bounds(arg)
+        x = pd.to_numeric(s, errors="coerce")
+        m = x.notna()
+        if lo is not None:
+            m &= x >= float(lo)
+        if hi is not None:
+            m &= x <= float(hi)
+        return m.to_numpy(dtype=bool)
+    if op == "isnull":
+        m = s.isna().to_numpy()
+        return m if arg else ~m
+    raise ValueError(f"Operador de filtro no soportado: {op}")
+
+class MaskCache:
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._masks: "OrderedDict[Tuple, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, df: pd.DataFrame, data_key: Hashable, op: str, var: str, arg) -> np.ndarray:
+        key = (data_key, op, var, _arg_key(arg))
+        with self._lock:
+            if key in self._masks:
+                self._masks.move_to_end(key)
+                return self._masks[key]
+        m = condition_mask(df, op, var, arg)
+        with self._lock:
+            self._masks[key] = m
+            while len(self._masks) > self.max_entries:
+                self._masks.popitem(last=False)
+        return m
+
+def filter_mask(df: pd.DataFrame, spec: dict, cache: Optional[MaskCache] = None, data_key: Hashable = None) -> Optional[np.ndarray]:
+    mask = None
+    for op, var, arg in compile_filter(spec):
+        if var not in df.columns:
+            continue
+        m = cache.get(df, data_key, op, var, arg) if cache is not None else condition_mask(df, op, var, arg)
+        mask = m if mask is None else mask & m
+    return mask
+
+def apply_block_filter(df_in, spec: dict, cache: Optional[MaskCache] = None, data_key: Hashable = None):
+    if not spec:
+        return df_in
+    mask = filter_mask(df_in, spec, cache=cache, data_key=data_key)
+    if mask is None:
+        return df_in
+    return df_in[mask]
@@ -1,8 +1,10 @@
 
 import re
+import numpy as np
 import pandas as pd
 import yaml
 from pathlib import Path
+from typing import Dict, List, Optional
 
 def load_rules(path: str):
     p = Path(path)
@@ -17,25 +19,76 @@ def pct_true(mask: pd.Series) -> float:
         return float("nan")
     return round(100.0 * (mask.sum() / denom), 2)
 
-def compute_indicators(df: pd.DataFrame, rules: dict) -> dict:
-    out = {}
-    for k, spec in rules.items():
-        var = spec.get("var")
-        if var not in df.columns:
-            out[k] = None
-            continue
-        s = df[var].astype(str).str.lower()
+def compile_rules(rules: dict) -> List[dict]:
+    plan = []
+    for k, spec in (rules or {}).items():
+        spec = spec or {}
+        step = {"name": k, "var": spec.get("var"), "kind": None}
         if "label_regex_any" in spec:
-            pats = spec["label_regex_any"]
-            mask = s.apply(lambda x: any(re.search(p, x) for p in pats))
-            out[k] = pct_true(mask)
+            pats = [str(p) for p in spec["label_regex_any"]]
+            step["kind"] = "regex"
+            step["pattern"] = re.compile("|".join(f"(?:{p})" for p in pats)) if pats else None
         elif "threshold" in spec:
             try:
-                vals = pd.to_numeric(df[var], errors="coerce").fillna(0)
-                mask = vals >= float(spec["threshold"])
-                out[k] = pct_true(mask)
-            except Exception:
-                out[k] = None
+                step["threshold"] = float(spec["threshold"])
+                step["kind"] = "threshold"
+            except (TypeError, ValueError):
+                pass
+        plan.append(step)
+    return plan
+
+def _regex_mask(s: pd.Series, pattern) -> np.ndarray:
+    codes, uniques = pd.factorize(s, use_na_sentinel=True)
+    if pattern is None:
+        return np.zeros(len(s), dtype=bool)
+    hits = np.fromiter((pattern.search(str(u).lower()) is not None for u in uniques), dtype=bool, count=len(uniques))
+    na_hit = pattern.search("nan") is not None
+    return np.append(hits, na_hit)[codes]
+
+def rule_mask(df: pd.DataFrame, step: dict) -> Optional[np.ndarray]:
+    var = step.get("var")
+    if var not in df.columns or step["kind"] is None:
+        return None
+    if step["kind"] == "regex":
+        return _regex_mask(df[var], step["pattern"])
+    vals = pd.to_numeric(df[var], errors="coerce").fillna(0)
+    return (vals >= step["threshold"]).to_numpy()
+
+def indicator_masks(df: pd.DataFrame, plan: List[dict]) -> pd.DataFrame:
+    cols = {}
+    for step in plan:
+        m = rule_mask(df, step)
+        if m is not None:
+            cols[step["name"]] = m
+    return pd.DataFrame(cols, index=df.index)
+
+def weighted_pct_true(mask: np.ndarray, w: pd.Series) -> float:
+    total = w.sum()
+    if total == 0:
+        return float("nan")
+    return round(100.0 * float(w[mask].sum() / total), 2)
+
+def compute_indicators(df: pd.DataFrame, rules, by: Optional[str] = None, weight: Optional[str] = None):
+    plan = rules if isinstance(rules, list) else compile_rules(rules)
+    if by is not None:
+        return compute_indicators_by(df, plan, by)
+    w = pd.to_numeric(df[weight], errors="coerce").fillna(0) if weight and weight in df.columns else None
+    out: Dict[str, Optional[float]] = {}
+    for step in plan:
+        m = rule_mask(df, step)
+        if m is None:
+            out[step["name"]] = None
         else:
-            out[k] = None
+            out[step["name"]] = pct_true(pd.Series(m)) if w is None else weighted_pct_true(m, w)
     return out
+
+def compute_indicators_by(df: pd.DataFrame, rules, by: str) -> pd.DataFrame:
+    plan = rules if isinstance(rules, list) else compile_rules(rules)
+    if by not in df.columns:
+        return pd.DataFrame()
+    masks = indicator_masks(df, plan)
+    out = (masks.groupby(df[by], observed=True).mean() * 100).round(2)
+    for step in plan:
+        if step["name"] not in out.columns:
+            out[step["name"]] = None
+    return out[[step["name"] for step in plan]]
@@ -1,18 +1,157 @@
 
-import pandas as pd
+import codecs
+import hashlib
 import json
+import os
+import re
+import threading
+import pandas as pd
 from pathlib import Path
+from typing import Iterator, List, Optional
 
-def read_data(path: str) -> pd.DataFrame:
+_FINGERPRINTS = {}
+
+def file_fingerprint(path: str, cache_dir: Optional[str] = None) -> str:
     p = Path(path)
-    if not p.exists():
-        raise FileNotFoundError(f"No se encuentra el archivo de datos: {path}")
-    for enc in [None, "utf-8-sig", "latin-1"]:
+    st_ = p.stat()
+    stamp = f"{st_.st_size}-{st_.st_mtime_ns}"
+    key = str(p.resolve())
+    memo = _FINGERPRINTS.get(key)
+    if memo and memo[0] == stamp:
+        return memo[1]
+    manifest = Path(cache_dir) / "fingerprints.json" if cache_dir else None
+    known = {}
+    if manifest and manifest.exists():
+        try:
+            with open(manifest, "r", encoding="utf-8") as f:
+                known = json.load(f)
+        except Exception:
+            known = {}
+    entry = known.get(key)
+    if entry and entry.get("stamp") == stamp:
+        digest = entry["hash"]
+    else:
+        h = hashlib.blake2b(digest_size=16)
+        with open(p, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        if manifest:
+            known[key] = {"stamp": stamp, "hash": digest}
+            manifest.parent.mkdir(parents=True, exist_ok=True)
+            tmp = manifest.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(known, f)
+            os.replace(tmp, manifest)
+    _FINGERPRINTS[key] = (stamp, digest)
+    return digest
+
+def _source_key(p: Path) -> str:
+    return hashlib.blake2b(str(p.resolve()).encode("utf-8"), digest_size=4).hexdigest()
+
+def ingest_path(path: str, cache_dir: str) -> Path:
+    p = Path(path)
+    return Path(cache_dir) / f"{p.stem}-{_source_key(p)}-{file_fingerprint(p, cache_dir)}.parquet"
+
+def _stale_ingests(p: Path, target: Path) -> Iterator[Path]:
+    pattern = re.compile(re.escape(p.stem) + rf"(-{_source_key(p)})?-[0-9a-f]{{32}}\.parquet")
+    for old in target.parent.glob(f"{p.stem}-*.parquet"):
+        if old != target and pattern.fullmatch(old.name):
+            yield old
+
+def _sniff_encoding(p: Path) -> Optional[str]:
+    with open(p, "rb") as f:
+        head = f.read(1 << 16)
+    if head.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+        return None
+    except UnicodeDecodeError:
+        return "latin-1"
+
+def _read_csv(p: Path, **kwargs) -> pd.DataFrame:
+    first = _sniff_encoding(p)
+    for enc in [first] + [e for e in [None, "utf-8-sig", "latin-1"] if e != first]:
         try:
-            return pd.read_csv(p, encoding=enc, low_memory=False)
+            return pd.read_csv(p, encoding=enc, low_memory=False, **kwargs)
         except Exception:
             continue
-    raise RuntimeError(f"No pude leer {path}")
+    raise RuntimeError(f"No pude leer {p}")
+
+def _write_parquet(df: pd.DataFrame, target: Path) -> bool:
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        df.to_parquet(tmp, index=False)
+    except Exception:
+        tmp.unlink(missing_ok=True)
+        return False
+    os.replace(tmp, target)
+    return True
+
+def _read_parquet(p: Path, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    if columns is not None:
+        import pyarrow.parquet as pq
+        names = set(pq.read_schema(p).names)
+        columns = [c for c in columns if c in names]
+    return pd.read_parquet(p, columns=columns, memory_map=True)
+
+def read_data(path: str, columns: Optional[List[str]] = None, cache_dir: Optional[str] = None) -> pd.DataFrame:
+    p = Path(path)
+    if not p.exists():
+        raise FileNotFoundError(f"No se encuentra el archivo de datos: {path}")
+    if p.suffix.lower() == ".parquet":
+        return _read_parquet(p, columns)
+    if cache_dir:
+        target = ingest_path(p, cache_dir)
+        if not target.exists():
+            df = _read_csv(p)
+            if not _write_parquet(df, target):
+                return df[[c for c in columns if c in df.columns]] if columns is not None else df
+            for old in _stale_ingests(p, target):
+                old.unlink(missing_ok=True)
+        return _read_parquet(target, columns)
+    if columns is not None:
+        wanted = set(columns)
+        return _read_csv(p, usecols=lambda c: c in wanted)
+    return _read_csv(p)
+
+def data_columns(path: str, cache_dir: Optional[str] = None) -> List[str]:
+    p = Path(path)
+    if not p.exists():
+        raise FileNotFoundError(f"No se encuentra el archivo de datos: {path}")
+    source = p if p.suffix.lower() == ".parquet" else None
+    if source is None and cache_dir and ingest_path(p, cache_dir).exists():
+        source = ingest_path(p, cache_dir)
+    if source is not None:
+        import pyarrow.parquet as pq
+        return list(pq.read_schema(source).names)
+    return list(_read_csv(p, nrows=0).columns)
+
+def iter_data_chunks(path: str, columns: Optional[List[str]] = None, chunksize: int = 100_000,
+                     cache_dir: Optional[str] = None) -> Iterator[pd.DataFrame]:
+    p = Path(path)
+    if not p.exists():
+        raise FileNotFoundError(f"No se encuentra el archivo de datos: {path}")
+    source = p if p.suffix.lower() == ".parquet" else None
+    if source is None and cache_dir:
+        target = ingest_path(p, cache_dir)
+        source = target if target.exists() else None
+    if source is not None:
+        import pyarrow.parquet as pq
+        pf = pq.ParquetFile(source, memory_map=True)
+        if columns is not None:
+            columns = [c for c in columns if c in set(pf.schema_arrow.names)]
+        for batch in pf.iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+        return
+    enc = _sniff_encoding(p)
+    wanted = set(columns) if columns is not None else None
+    usecols = (lambda c: c in wanted) if wanted is not None else None
+    with pd.read_csv(p, encoding=enc, usecols=usecols, chunksize=chunksize, low_memory=False) as reader:
+        for chunk in reader:
+            yield chunk
 
 def read_codebook(path: str) -> pd.DataFrame:
     p = Path(path)
@@ -1,14 +1,22 @@
 
+import hashlib
+import os
+import pickle
+import threading
+import numpy as np
 import pandas as pd
+from pathlib import Path
 from typing import Dict, List, Optional
 
-def _canonicalize_var_name(name: str, df_cols: Optional[List[str]] = None) -> str:
-    if df_cols:
-        target = str(name).strip().lower()
-        for c in df_cols:
-            if str(c).strip().lower() == target:
-                return c
-    return str(name)
+from src.io import file_fingerprint, read_codebook
+
+LABELS_VERSION = 2
+
+def _column_index(df_cols: Optional[List[str]]) -> Dict[str, str]:
+    index: Dict[str, str] = {}
+    for c in df_cols or []:
+        index.setdefault(str(c).strip().lower(), c)
+    return index
 
 def normalize_codebook(df_cb: pd.DataFrame, df_columns: Optional[List[str]] = None) -> pd.DataFrame:
     if df_cb is None or df_cb.empty:
@@ -26,7 +34,10 @@ def normalize_codebook(df_cb: pd.DataFrame, df_columns: Optional[List[str]] = No
     out = df_cb[[var_col, val_col, lab_val_col, lab_var_col]].copy()
     out.columns = ["variable","value","label_value","label_variable"]
     out["variable"] = out["variable"].astype(str).str.strip()
-    out["variable"] = out["variable"].apply(lambda v: _canonicalize_var_name(v, df_columns))
+    index = _column_index(df_columns)
+    if index:
+        canon = out["variable"].str.lower().map(index)
+        out["variable"] = canon.where(canon.notna(), out["variable"])
     out["value_str"] = out["value"].astype(str).str.strip()
     return out[["variable","value","value_str","label_value","label_variable"]]
 
@@ -39,39 +50,90 @@ def build_label_maps(df_cb: pd.DataFrame, df_columns: Optional[List[str]] = None
             var_labels[str(var)] = s
 
     val_labels: Dict[str, Dict] = {}
-    for var, g in cb.groupby("variable"):
-        sub = g.dropna(subset=["value","label_value"])
-        if sub.empty:
-            continue
+    sub = cb.dropna(subset=["value","label_value"])
+    lv = sub["label_value"].astype(str).str.strip()
+    keep = (lv != "") & (lv.str.lower() != "nan")
+    sub, lv = sub[keep], lv[keep]
+    if sub.empty:
+        return var_labels, val_labels
+    num = pd.to_numeric(sub["value"], errors="coerce").to_numpy(dtype="float64")
+    finite = np.isfinite(num)
+    as_int = np.where(finite, np.trunc(np.where(finite, num, 0)), 0).astype("int64")
+    keys_str = sub["value_str"].astype(str).tolist()
+    keys_int = [int(v) if ok else None for v, ok in zip(as_int.tolist(), finite.tolist())]
+    keys_float = [None if v != v else v for v in num.tolist()]
+    labels = lv.tolist()
+    for var, pos in sorted(sub.groupby("variable").indices.items()):
         mapping = {}
-        for _, row in sub.iterrows():
-            lv = str(row["label_value"]).strip()
-            if not lv or lv.lower() == "nan":
-                continue
-            mapping[str(row["value_str"])] = lv
-            try:
-                vi = int(float(row["value"]))
-                mapping[vi] = lv
-            except Exception:
-                pass
-            try:
-                vf = float(row["value"])
-                mapping[vf] = lv
-            except Exception:
-                pass
+        for i in pos:
+            mapping[keys_str[i]] = labels[i]
+            if keys_int[i] is not None:
+                mapping[keys_int[i]] = labels[i]
+            if keys_float[i] is not None:
+                mapping[keys_float[i]] = labels[i]
         if mapping:
             val_labels[str(var)] = mapping
     return var_labels, val_labels
 
-def apply_value_labels(df: pd.DataFrame, val_labels: Dict[str, Dict]) -> pd.DataFrame:
+def load_label_maps(codebook_path: str, df_columns: Optional[List[str]] = None, cache_dir: Optional[str] = None) -> (Dict[str, str], Dict[str, Dict]):
+    target = None
+    if cache_dir and Path(codebook_path).exists():
+        cols_key = hashlib.blake2b("\x1f".join(map(str, df_columns or [])).encode("utf-8"), digest_size=8).hexdigest()
+        prefix = f"labels-v{LABELS_VERSION}-{file_fingerprint(codebook_path, cache_dir)}-"
+        target = Path(cache_dir) / f"{prefix}{cols_key}.pkl"
+        if target.exists():
+            try:
+                with open(target, "rb") as f:
+                    return pickle.load(f)
+            except Exception:
+                pass
+    maps = build_label_maps(read_codebook(codebook_path), df_columns=df_columns)
+    if target is not None:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump(maps, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, target)
+        for old in target.parent.glob("labels-*.pkl"):
+            if not old.name.startswith(prefix):
+                old.unlink(missing_ok=True)
+    return maps
+
+def _lookup_label(value, mapping: Dict):
+    try:
+        lab = mapping.get(value)
+    except TypeError:
+        lab = None
+    if lab is None:
+        lab = mapping.get(str(value))
+    return lab
+
+def apply_value_labels(df: pd.DataFrame, val_labels: Dict[str, Dict], categorical: bool = False) -> pd.DataFrame:
     if not val_labels:
         return df
-    out = df.copy()
+    out = df.copy(deep=False)
     for var, mapping in val_labels.items():
-        if var in out.columns:
-            orig = out[var]
-            mapped = orig.map(mapping)
-            mapped2 = orig.astype(str).map(mapping)
-            combined = mapped.where(mapped.notna(), mapped2)
-            out[var] = combined.where(combined.notna(), orig)
+        if var not in out.columns:
+            continue
+        orig = out[var]
+        codes, uniques = pd.factorize(orig, use_na_sentinel=True)
+        labels = [_lookup_label(u, mapping) for u in uniques]
+        labels = [u if lab is None else lab for u, lab in zip(uniques, labels)]
+        if categorical:
+            present = set(labels)
+            order = {lab: None for lab in mapping.values() if lab in present}
+            rest = [lab for lab in dict.fromkeys(labels) if lab not in order]
+            try:
+                rest = sorted(rest)
+            except TypeError:
+                pass
+            cats = list(order) + rest
+            pos = {lab: i for i, lab in enumerate(cats)}
+            remap = np.array([pos[lab] for lab in labels] + [-1], dtype=np.int32)
+            out[var] = pd.Categorical.from_codes(remap[codes], categories=cats)
+        else:
+            values = np.empty(len(labels) + 1, dtype=object)
+            values[:-1] = labels
+            values[-1] = np.nan
+            out[var] = pd.Series(values[codes], index=out.index)
     return out
@@ -1,12 +1,73 @@
 
+import math
+from typing import List, Optional, Tuple
+
+import numpy as np
 import pydeck as pdk
 import pandas as pd
 
-def scatter_points(df: pd.DataFrame, lat_col: str, lon_col: str, get_fill_color="[0, 128, 255]"):
+METERS_PER_DEGREE = 111_320.0
+
+def map_frame(df: pd.DataFrame, lat_col: str, lon_col: str, extra: List[str] = ()) -> Optional[pd.DataFrame]:
     if not lat_col or not lon_col or lat_col not in df.columns or lon_col not in df.columns:
         return None
-    pts = df.dropna(subset=[lat_col, lon_col])
-    if pts.empty:
+    cols = list(dict.fromkeys([lat_col, lon_col] + [c for c in extra if c and c in df.columns]))
+    pts = df[cols].copy()
+    pts[lat_col] = pd.to_numeric(pts[lat_col], errors="coerce")
+    pts[lon_col] = pd.to_numeric(pts[lon_col], errors="coerce")
+    pts = pts[pts[lat_col].between(-90, 90) & pts[lon_col].between(-180, 180)]
+    return pts if not pts.empty else None
+
+def fit_view(lat: np.ndarray, lon: np.ndarray, width_px: int = 800) -> Tuple[float, float, float]:
+    lo_lat, hi_lat = np.nanpercentile(lat, [1, 99])
+    lo_lon, hi_lon = np.nanpercentile(lon, [1, 99])
+    span_m = max((hi_lon - lo_lon) * METERS_PER_DEGREE * math.cos(math.radians((lo_lat + hi_lat) / 2)),
+                 (hi_lat - lo_lat) * METERS_PER_DEGREE, 500.0)
+    zoom = math.log2(156_543.03392 * width_px / span_m)
+    return float((lo_lat + hi_lat) / 2), float((lo_lon + hi_lon) / 2), round(min(max(zoom, 3.0), 18.0), 1)
+
+def cell_size_m(zoom: float, lat: float, cell_px: int = 24) -> float:
+    return cell_px * 156_543.03392 * math.cos(math.radians(lat)) / (2 ** zoom)
+
+def grid_bins(lat: np.ndarray, lon: np.ndarray, cell_m: float, lat0: float, rates: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    kx = METERS_PER_DEGREE * math.cos(math.radians(lat0)) / cell_m
+    ky = METERS_PER_DEGREE / cell_m
+    cells = np.stack([np.floor(lon * kx), np.floor(lat * ky)], axis=1).astype(np.int64)
+    corners, codes = np.unique(cells, axis=0, return_inverse=True)
+    codes = codes.ravel()
+    n = np.bincount(codes, minlength=len(corners))
+    out = pd.DataFrame({"lon": np.round(corners[:, 0] / kx, 6), "lat": np.round(corners[:, 1] / ky, 6), "n": n})
+    for name in (rates.columns if rates is not None else []):
+        hits = np.bincount(codes, weights=rates[name].to_numpy(dtype="float64"), minlength=len(corners))
+        out[name] = np.round(100 * hits / n, 1)
+    return out
+
+def _ramp(values: np.ndarray, vmax: Optional[float] = None) -> np.ndarray:
+    t = values / (vmax if vmax else max(float(values.max()), 1.0)) if len(values) else values
+    t = np.clip(np.nan_to_num(t), 0, 1)
+    lo, hi = np.array([255, 237, 160]), np.array([189, 0, 38])
+    return np.rint(lo + (hi - lo) * t[:, None]).astype(np.int16)
+
+def grid_layer(bins: pd.DataFrame, cell_m: float, color_by: str = "n"):
+    if bins is None or bins.empty:
+        return None
+    data = bins.copy()
+    rgb = _ramp(data[color_by].to_numpy(dtype="float64"), 100.0 if color_by != "n" else None)
+    data["r"], data["g"], data["b"] = rgb[:, 0], rgb[:, 1], rgb[:, 2]
+    layer = pdk.Layer(
+        "GridCellLayer",
+        data=data,
+        get_position=["lon", "lat"],
+        cell_size=cell_m,
+        extruded=False,
+        pickable=True,
+        get_fill_color="[r, g, b, 170]",
+    )
+    return layer
+
+def scatter_points(df: pd.DataFrame, lat_col: str, lon_col: str, get_fill_color="[0, 128, 255]", tooltip_cols: List[str] = ()):
+    pts = map_frame(df, lat_col, lon_col, extra=tooltip_cols)
+    if pts is None:
         return None
     layer = pdk.Layer(
         "ScatterplotLayer",
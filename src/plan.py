@@ -0,0 +1,171 @@
+
+import json
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from src.cache import ResultCache
+from src.cube import block_rows, cube_table
+from src.estimation import ReplicateDesign, estimate_table, variance_columns
+from src.features import FEATURES, feature_columns
+from src.filters import MaskCache, apply_block_filter, compile_filter
+from src.tables import freq, crosstab_binned, summarize_numeric
+from src.utils import NULL_PROFILER, Profiler
+
+def spec_key(spec) -> str:
+    return json.dumps(spec or {}, sort_keys=True, ensure_ascii=False, default=str)
+
+def _compile_table(spec: dict) -> Optional[Tuple]:
+    if "freq" in spec:
+        return ("freq", spec["freq"])
+    if "crosstab" in spec:
+        ct = spec["crosstab"] or {}
+        return ("crosstab", ct.get("row"), ct.get("col"), ct.get("weight"))
+    if "summary" in spec:
+        return ("summary", (spec["summary"] or {}).get("var"))
+    return None
+
+def compile_plan(plan: dict) -> dict:
+    filters: Dict[str, dict] = {}
+    nodes: Dict[str, List[Tuple]] = {}
+    blocks = []
+    for block in (plan or {}).get("blocks", []):
+        fspec = block.get("filter", {}) or {}
+        fkey = spec_key(fspec)
+        filters.setdefault(fkey, fspec)
+        node = nodes.setdefault(fkey, [])
+        tables = []
+        for spec in block.get("tables", []) or []:
+            t = _compile_table(spec)
+            if t is None:
+                continue
+            tables.append(t)
+            if t not in node:
+                node.append(t)
+        blocks.append({"name": block.get("name", "Bloque"), "filter": fkey, "tables": tables})
+    return {"filters": filters, "nodes": nodes, "blocks": blocks}
+
+def table_columns(table: Tuple) -> List[str]:
+    if table[0] == "crosstab":
+        return [table[1], table[2]]
+    return [table[1]]
+
+CFG_COLUMNS = ("id_col", "weight_col", "lat_col", "lon_col", "key_filter_col")
+
+def referenced_variables(plan: dict, rule_plan: Optional[List[dict]] = None, cfg: Optional[dict] = None) -> List[str]:
+    wanted = []
+    for fspec in plan["filters"].values():
+        wanted.extend(var for _, var, _ in compile_filter(fspec))
+    for tables in plan["nodes"].values():
+        for t in tables:
+            wanted.extend(table_columns(t))
+            if t[0] == "crosstab" and t[3]:
+                wanted.append(t[3])
+    wanted.extend(step["var"] for step in rule_plan or [])
+    wanted.extend((cfg or {}).get(k) for k in CFG_COLUMNS)
+    return [c for c in dict.fromkeys(wanted) if c]
+
+def plan_features(plan: dict, rule_plan: Optional[List[dict]] = None, cfg: Optional[dict] = None) -> List[str]:
+    return [v for v in referenced_variables(plan, rule_plan, cfg) if v in FEATURES]
+
+def referenced_columns(plan: dict, columns: List[str], rule_plan: Optional[List[dict]] = None, cfg: Optional[dict] = None) -> List[str]:
+    wanted = referenced_variables(plan, rule_plan, cfg)
+    wanted.extend(variance_columns(cfg, columns))
+    wanted.extend(feature_columns(columns, [v for v in wanted if v in FEATURES]))
+    present = set(columns)
+    return [c for c in dict.fromkeys(wanted) if c in present]
+
+def run_table(df: pd.DataFrame, table: Tuple, weight: Optional[str] = None) -> Optional[pd.DataFrame]:
+    if any(c not in df.columns for c in table_columns(table)):
+        return None
+    if table[0] == "freq":
+        return freq(df, table[1], weight=weight)
+    if table[0] == "crosstab":
+        return crosstab_binned(df, table[1], table[2], weight=table[3] or weight, normalize="index")
+    return summarize_numeric(df, table[1], weight=weight)
+
+def stack_by(frames: Dict, by: str) -> pd.DataFrame:
+    out = pd.concat(frames, names=[by])
+    if all(f.index.name is None for f in frames.values()):
+        out = out.reset_index(level=0).reset_index(drop=True)
+    return out
+
+class PlanExecutor:
+    def __init__(self, plan: dict, cache: Optional[ResultCache] = None, max_frames: int = 16):
+        self.plan = compile_plan(plan)
+        self.results = cache if cache is not None else ResultCache()
+        self.max_frames = max_frames
+        self._frames: "OrderedDict[Tuple, pd.DataFrame]" = OrderedDict()
+        self.masks = MaskCache()
+        self._lock = threading.Lock()
+
+    @property
+    def blocks(self) -> List[dict]:
+        return self.plan["blocks"]
+
+    def frame(self, df: pd.DataFrame, data_key: Tuple, fkey: str) -> pd.DataFrame:
+        key = (data_key, fkey)
+        with self._lock:
+            hit = self._frames.get(key)
+            if hit is not None:
+                self._frames.move_to_end(key)
+                return hit
+        out = apply_block_filter(df, self.plan["filters"][fkey], cache=self.masks, data_key=data_key)
+        with self._lock:
+            self._frames[key] = out
+            while len(self._frames) > self.max_frames:
+                self._frames.popitem(last=False)
+        return out
+
+    def table(self, df: pd.DataFrame, data_key: Tuple, fkey: str, table: Tuple, weight: Optional[str] = None, cube: Optional[dict] = None, selected=None):
+        def compute():
+            if cube is not None and cube.get("weight") == weight:
+                return cube_table(cube, fkey, table, selected)
+            return run_table(self.frame(df, data_key, fkey), table, weight=weight)
+        return self.results.get_or_compute(("table", data_key, fkey, table, weight), compute)
+
+    def run_block(self, df: pd.DataFrame, data_key: Tuple, block: dict, weight: Optional[str] = None, cube: Optional[dict] = None,
+                  selected=None, profiler: Profiler = NULL_PROFILER):
+        fkey = block["filter"]
+        with profiler.stage("filtro de bloque", name=block["name"]) as rec:
+            if cube is not None and cube.get("weight") == weight:
+                n = block_rows(cube, fkey, selected)
+            else:
+                n = len(self.frame(df, data_key, fkey))
+            rec["rows"] = n
+        results = []
+        if n == 0:
+            return n, results
+        for t in block["tables"]:
+            with profiler.stage("tabla", name=" | ".join(str(x) for x in t if x), rows=n):
+                results.append((t, self.table(df, data_key, fkey, t, weight=weight, cube=cube, selected=selected)))
+        return n, results
+
+    def run_block_by(self, df: pd.DataFrame, data_key: Tuple, block: dict, by: str, weight: Optional[str] = None,
+                     profiler: Profiler = NULL_PROFILER):
+        parts = {value: self.run_block(sub, data_key + ((by, value),), block, weight=weight, profiler=profiler)
+                 for value, sub in df.groupby(by, sort=False, observed=True)}
+        results = []
+        for i, t in enumerate(block["tables"]):
+            frames = {v: res[i][1] for v, (n, res) in parts.items() if n and res[i][1] is not None}
+            results.append((t, stack_by(frames, by) if frames else None))
+        return sum(n for n, _ in parts.values()), results
+
+    def estimate_block(self, df: pd.DataFrame, data_key: Tuple, block: dict, design: ReplicateDesign, profiler: Profiler = NULL_PROFILER):
+        fkey = block["filter"]
+        out, sub = [], None
+        for t in block["tables"]:
+            key = ("estimate", data_key, fkey, t, design.key)
+            est = self.results.get(key, self)
+            if est is self:
+                with profiler.stage("estimación", name=" | ".join(str(x) for x in t if x)) as rec:
+                    frame = self.frame(df, data_key, fkey)
+                    if sub is None:
+                        sub = design.subset(frame.index)
+                    est = estimate_table(frame, t, sub) if len(frame) else None
+                    rec["rows"] = len(frame)
+                self.results.put(key, est)
+            out.append((t, est))
+        return out
@@ -0,0 +1,172 @@
+
+import hashlib
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_bool_dtype, is_numeric_dtype
+
+from src.io import read_data
+from src.labels import apply_value_labels
+from src.tables import freq_from_counts
+
+PROFILE_VALUES = 200
+PROFILE_COLUMNS = ["var", "g", "rows", "nulls", "nunique", "min", "max", "dtype", "numeric", "total_unique"]
+PROFILE_VALUE_COLUMNS = ["var", "g", "value_num", "value_str", "order", "n", "w"]
+
+def _group_keys(df: pd.DataFrame, by: Optional[str]) -> np.ndarray:
+    if not by or by not in df.columns:
+        return np.full(len(df), None, dtype=object)
+    s = df[by].astype(object)
+    return np.where(s.isna(), None, s.astype(str)).astype(object)
+
+def _is_numeric(s: pd.Series) -> bool:
+    return is_numeric_dtype(s) and not is_bool_dtype(s)
+
+def profile_frame(df: pd.DataFrame, by: Optional[str] = None, weight: Optional[str] = None,
+                  columns: Optional[Iterable[str]] = None, max_values: int = PROFILE_VALUES) -> Dict[str, pd.DataFrame]:
+    g = _group_keys(df, by)
+    w = pd.to_numeric(df[weight], errors="coerce").fillna(0).to_numpy() if weight and weight in df.columns else np.zeros(len(df))
+    col_parts, value_parts = [], []
+    for var in columns or df.columns:
+        if var not in df.columns:
+            continue
+        s = df[var]
+        numeric = _is_numeric(s)
+        v = pd.to_numeric(s, errors="coerce").to_numpy(dtype="float64") if numeric else s.to_numpy(dtype=object)
+        counts = pd.DataFrame({"g": g, "v": v, "w": w}).groupby(["g", "v"], dropna=False, sort=False)["w"].agg(["size", "sum"])
+        counts.columns = ["n", "w"]
+        counts = counts.reset_index()
+        isnull = counts["v"].isna()
+        present = counts[~isnull]
+        per_group = counts.groupby("g", dropna=False, sort=False).agg(rows=("n", "sum"))
+        per_group["nulls"] = counts[isnull].groupby("g", dropna=False, sort=False)["n"].sum().reindex(per_group.index, fill_value=0)
+        per_group["nunique"] = present.groupby("g", dropna=False, sort=False).size().reindex(per_group.index, fill_value=0)
+        if numeric and len(present):
+            bounds = present.groupby("g", dropna=False, sort=False)["v"].agg(["min", "max"])
+            per_group["min"] = bounds["min"].reindex(per_group.index)
+            per_group["max"] = bounds["max"].reindex(per_group.index)
+        else:
+            per_group["min"], per_group["max"] = np.nan, np.nan
+        per_group = per_group.reset_index()
+        per_group.insert(0, "var", var)
+        per_group["dtype"] = str(s.dtype)
+        per_group["numeric"] = numeric
+        per_group["total_unique"] = present["v"].nunique()
+        col_parts.append(per_group)
+        if present["v"].nunique() <= max_values:
+            vals = pd.DataFrame({"var": var, "g": present["g"].to_numpy(),
+                                 "value_num": present["v"].to_numpy(dtype="float64") if numeric else np.nan,
+                                 "value_str": None if numeric else present["v"].map(str).to_numpy(),
+                                 "order": np.arange(len(present)), "n": present["n"].to_numpy(), "w": present["w"].to_numpy()})
+            if not numeric and isinstance(s.dtype, pd.CategoricalDtype):
+                pos = {str(c): i for i, c in enumerate(s.cat.categories)}
+                vals["order"] = vals["value_str"].map(pos)
+            value_parts.append(vals)
+    columns_df = pd.concat(col_parts, ignore_index=True) if col_parts else pd.DataFrame(columns=PROFILE_COLUMNS)
+    values_df = pd.concat(value_parts, ignore_index=True) if value_parts else pd.DataFrame(columns=PROFILE_VALUE_COLUMNS)
+    values_df["value_str"] = values_df["value_str"].astype(object)
+    return {"columns": columns_df, "values": values_df}
+
+def build_profile(path: str, columns: List[str], val_labels: Dict[str, Dict], by: Optional[str] = None, weight: Optional[str] = None,
+                  categorical: bool = False, cache_dir: Optional[str] = None, batch: int = 32, max_values: int = PROFILE_VALUES) -> dict:
+    parts = []
+    for i in range(0, len(columns), batch):
+        cols = list(columns[i:i + batch])
+        part = read_data(path, columns=list(dict.fromkeys(cols + [c for c in (by, weight) if c])), cache_dir=cache_dir)
+        labels = {k: v for k, v in val_labels.items() if k in part.columns}
+        parts.append(profile_frame(apply_value_labels(part, labels, categorical=categorical), by=by, weight=weight,
+                                   columns=cols, max_values=max_values))
+    if not parts:
+        parts = [profile_frame(pd.DataFrame())]
+    return {"by": by, "weighted": bool(weight),
+            "columns": pd.concat([p["columns"] for p in parts], ignore_index=True),
+            "values": pd.concat([p["values"] for p in parts], ignore_index=True)}
+
+def load_profile(path: str, columns: List[str], val_labels: Dict[str, Dict], by: Optional[str], weight: Optional[str],
+                 categorical: bool, cache_dir: Optional[str], data_fp: str, codebook_fp: Optional[str]) -> dict:
+    tag = hashlib.blake2b(repr((str(Path(path).resolve()), codebook_fp, categorical, by, weight, PROFILE_VALUES, tuple(columns))).encode(), digest_size=6).hexdigest()
+    targets = {k: Path(cache_dir) / f"profile-{data_fp}-{tag}-{k}.parquet" for k in ("columns", "values")} if cache_dir else None
+    if targets is not None and all(t.exists() for t in targets.values()):
+        try:
+            return {"by": by, "weighted": bool(weight), **{k: pd.read_parquet(t) for k, t in targets.items()}}
+        except Exception:
+            pass
+    profile = build_profile(path, columns, val_labels, by=by, weight=weight, categorical=categorical, cache_dir=cache_dir)
+    if targets is not None:
+        for k, target in targets.items():
+            target.parent.mkdir(parents=True, exist_ok=True)
+            tmp = target.with_suffix(f".{os.getpid()}.tmp")
+            profile[k].to_parquet(tmp, index=False)
+            os.replace(tmp, target)
+        current = {t.name for t in targets.values()}
+        for old in Path(cache_dir).glob(f"profile-*-{tag}-*.parquet"):
+            if old.name not in current:
+                old.unlink(missing_ok=True)
+    return profile
+
+def combine_profiles(profiles: List[dict]) -> dict:
+    if len(profiles) == 1:
+        return profiles[0]
+    columns = pd.concat([p["columns"] for p in profiles], ignore_index=True)
+    upper = pd.concat([p["columns"].groupby("var")["total_unique"].max() for p in profiles], axis=1).sum(axis=1)
+    columns["total_unique"] = columns["var"].map(upper).astype("int64")
+    enumerated = set.intersection(*(set(p["values"]["var"]) for p in profiles))
+    values = pd.concat([p["values"][p["values"]["var"].isin(enumerated)] for p in profiles], ignore_index=True)
+    return {"by": profiles[0]["by"], "weighted": all(p["weighted"] for p in profiles), "columns": columns, "values": values,
+            "combined": True}
+
+def _select(frame: pd.DataFrame, selected: Optional[Iterable]) -> pd.DataFrame:
+    if selected:
+        return frame[frame["g"].isin([str(v) for v in selected])]
+    return frame
+
+def profile_cardinality(profile: dict, selected: Optional[Iterable] = None) -> pd.Series:
+    return _cardinality(profile, selected)[0]
+
+def _cardinality(profile: dict, selected: Optional[Iterable]):
+    cols = profile["columns"]
+    total = cols.groupby("var", sort=False)["total_unique"].max()
+    if selected:
+        out = _select(cols, selected).groupby("var", sort=False)["nunique"].sum().reindex(total.index, fill_value=0).clip(upper=total)
+    else:
+        out = total.copy()
+    values = _select(profile["values"], selected)
+    key = values["value_str"].where(values["value_str"].notna(), values["value_num"])
+    out.update(key.groupby(values["var"], sort=False).nunique())
+    enumerated = total.index.isin(profile["values"]["var"].unique())
+    out[enumerated & ~out.index.isin(values["var"].unique())] = 0
+    if profile.get("combined"):
+        exact = enumerated
+    elif selected:
+        exact = enumerated | (_select(cols, selected).groupby("var", sort=False).size().reindex(total.index, fill_value=0) <= 1).to_numpy()
+    else:
+        exact = np.ones(len(total), dtype=bool)
+    return out.astype("int64"), pd.Series(exact, index=total.index)
+
+def profile_stats(profile: dict, var: str, selected: Optional[Iterable] = None) -> Optional[dict]:
+    cols = _select(profile["columns"], selected)
+    cols = cols[cols["var"] == var]
+    if cols.empty:
+        return None
+    card, exact = _cardinality(profile, selected)
+    return {"dtype": cols["dtype"].iloc[0], "rows": int(cols["rows"].sum()), "nulls": int(cols["nulls"].sum()),
+            "nunique": int(card.get(var, 0)), "nunique_exact": bool(exact.get(var, True)),
+            "min": cols["min"].min(), "max": cols["max"].max()}
+
+def profile_freq(profile: dict, var: str, selected: Optional[Iterable] = None, weighted: bool = False) -> Optional[pd.DataFrame]:
+    meta = profile["columns"][profile["columns"]["var"] == var]
+    if meta.empty or not (profile["values"]["var"] == var).any() or (weighted and not profile["weighted"]):
+        return None
+    values = _select(profile["values"][profile["values"]["var"] == var], selected)
+    numeric = bool(meta["numeric"].iloc[0])
+    key = "value_num" if numeric else "value_str"
+    counts = values.groupby(key, sort=False).agg(n=("n", "sum"), w=("w", "sum"), order=("order", "min")).sort_values("order", kind="stable")
+    s = counts["w" if weighted else "n"]
+    if numeric and meta["dtype"].iloc[0].lower().startswith(("int", "uint")):
+        s.index = s.index.astype("int64")
+    elif meta["dtype"].iloc[0] == "category":
+        s.index = pd.CategoricalIndex(s.index, categories=list(s.index), name=s.index.name)
+    return freq_from_counts(s, var)
@@ -0,0 +1,146 @@
+
+import hashlib
+import math
+import os
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+POLYGON_COL = "poligono"
+SPATIAL_CACHE_FILES = 16
+
+def _rings(geometry: Optional[dict]) -> List[np.ndarray]:
+    if not geometry:
+        return []
+    coords = geometry.get("coordinates") or []
+    if geometry.get("type") == "Polygon":
+        polys = [coords]
+    elif geometry.get("type") == "MultiPolygon":
+        polys = coords
+    else:
+        return []
+    return [np.asarray(r, dtype="float64")[:, :2] for poly in polys for r in poly if len(r) >= 3]
+
+def _edges(rings: List[np.ndarray]) -> np.ndarray:
+    return np.concatenate([np.column_stack([r[:, 0], r[:, 1], np.roll(r[:, 0], -1), np.roll(r[:, 1], -1)]) for r in rings])
+
+def contains(edges: np.ndarray, x: np.ndarray, y: np.ndarray, max_cells: int = 4_000_000) -> np.ndarray:
+    x1, y1, x2, y2 = edges.T
+    dy = np.where(y2 == y1, np.inf, y2 - y1)
+    out = np.zeros(len(x), dtype=bool)
+    step = max(1, max_cells // max(len(edges), 1))
+    for i in range(0, len(x), step):
+        px, py = x[i:i + step, None], y[i:i + step, None]
+        straddle = (y1 > py) != (y2 > py)
+        cross = straddle & (px < x1 + (py - y1) * (x2 - x1) / dy)
+        out[i:i + step] = cross.sum(axis=1) % 2 == 1
+    return out
+
+class PolygonIndex:
+    def __init__(self, geojson_obj: dict, key_prop: Optional[str] = None, grid_size: Optional[int] = None):
+        self.keys, self.edges, boxes = [], [], []
+        for i, feat in enumerate((geojson_obj or {}).get("features") or []):
+            rings = _rings(feat.get("geometry"))
+            if not rings:
+                continue
+            props = feat.get("properties") or {}
+            self.keys.append(props.get(key_prop) if key_prop else props.get("name", str(i)))
+            self.edges.append(_edges(rings))
+            pts = np.concatenate(rings)
+            boxes.append([pts[:, 0].min(), pts[:, 1].min(), pts[:, 0].max(), pts[:, 1].max()])
+        self.bbox = np.asarray(boxes, dtype="float64").reshape(-1, 4)
+        self.grid = grid_size or min(max(1, 2 * int(math.sqrt(len(self.keys)))), 512)
+        self._build_grid()
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def _cell(self, x: np.ndarray, y: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        cx = np.floor((x - self.extent[0]) / self.cell_w).astype(np.int64)
+        cy = np.floor((y - self.extent[1]) / self.cell_h).astype(np.int64)
+        return np.clip(cx, 0, self.grid - 1), np.clip(cy, 0, self.grid - 1)
+
+    def _build_grid(self):
+        if not len(self):
+            self.extent, self.cell_start, self.cell_polys = np.zeros(4), np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int64)
+            return
+        self.extent = np.array([self.bbox[:, 0].min(), self.bbox[:, 1].min(), self.bbox[:, 2].max(), self.bbox[:, 3].max()])
+        self.cell_w = max((self.extent[2] - self.extent[0]) / self.grid, 1e-12)
+        self.cell_h = max((self.extent[3] - self.extent[1]) / self.grid, 1e-12)
+        x0, y0 = self._cell(self.bbox[:, 0], self.bbox[:, 1])
+        x1, y1 = self._cell(self.bbox[:, 2], self.bbox[:, 3])
+        cells, polys = [], []
+        for p in range(len(self)):
+            gx, gy = np.meshgrid(np.arange(x0[p], x1[p] + 1), np.arange(y0[p], y1[p] + 1))
+            ids = (gy * self.grid + gx).ravel()
+            cells.append(ids)
+            polys.append(np.full(len(ids), p, dtype=np.int64))
+        cells, polys = np.concatenate(cells), np.concatenate(polys)
+        order = np.lexsort((polys, cells))
+        self.cell_polys = polys[order]
+        self.cell_start = np.searchsorted(cells[order], np.arange(self.grid * self.grid + 1))
+
+    def candidates(self, x: np.ndarray, y: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        inside = (x >= self.extent[0]) & (x <= self.extent[2]) & (y >= self.extent[1]) & (y <= self.extent[3])
+        pts = np.flatnonzero(inside)
+        cx, cy = self._cell(x[pts], y[pts])
+        cell = cy * self.grid + cx
+        start, counts = self.cell_start[cell], self.cell_start[cell + 1] - self.cell_start[cell]
+        pi = np.repeat(pts, counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        pp = self.cell_polys[np.repeat(start, counts) + offsets]
+        b = self.bbox[pp]
+        keep = (x[pi] >= b[:, 0]) & (x[pi] <= b[:, 2]) & (y[pi] >= b[:, 1]) & (y[pi] <= b[:, 3])
+        return pi[keep], pp[keep]
+
+    def locate(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        out = np.full(len(x), -1, dtype=np.int64)
+        if not len(self) or not len(x):
+            return out
+        pi, pp = self.candidates(x, y)
+        order = np.argsort(pp, kind="stable")
+        pi, pp = pi[order], pp[order]
+        bounds = np.flatnonzero(np.diff(pp)) + 1
+        for pts, poly in zip(np.split(pi, bounds), pp[np.r_[0, bounds]] if len(pp) else []):
+            pts = pts[out[pts] < 0]
+            if len(pts):
+                hit = contains(self.edges[poly], x[pts], y[pts])
+                out[pts[hit]] = poly
+        return out
+
+def assign_polygons(df: pd.DataFrame, lat_col: str, lon_col: str, index: PolygonIndex) -> pd.Series:
+    lat = pd.to_numeric(df[lat_col], errors="coerce").to_numpy(dtype="float64") if lat_col in df.columns else np.full(len(df), np.nan)
+    lon = pd.to_numeric(df[lon_col], errors="coerce").to_numpy(dtype="float64") if lon_col in df.columns else np.full(len(df), np.nan)
+    ok = np.isfinite(lat) & np.isfinite(lon)
+    ids = np.full(len(df), -1, dtype=np.int64)
+    ids[ok] = index.locate(lon[ok], lat[ok])
+    keys = np.asarray(index.keys + [None], dtype=object)
+    return pd.Series(keys[ids], index=df.index, name=POLYGON_COL)
+
+def load_polygon_assignment(df: pd.DataFrame, lat_col: str, lon_col: str, geojson_obj: dict, key_prop: Optional[str],
+                            cache_dir: Optional[str], data_fp: str, geo_fp: str) -> pd.Series:
+    tag = hashlib.blake2b(repr((lat_col, lon_col, key_prop, len(df))).encode(), digest_size=6).hexdigest()
+    target = Path(cache_dir) / f"spatial-{data_fp}-{geo_fp}-{tag}.parquet" if cache_dir else None
+    if target is not None and target.exists():
+        try:
+            cached = pd.read_parquet(target)[POLYGON_COL]
+            cached.index = df.index
+            os.utime(target)
+            return cached
+        except Exception:
+            pass
+    out = assign_polygons(df, lat_col, lon_col, PolygonIndex(geojson_obj, key_prop=key_prop)).astype("string")
+    if target is not None:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_suffix(f".{os.getpid()}.tmp")
+        out.to_frame().reset_index(drop=True).to_parquet(tmp, index=False)
+        os.replace(tmp, target)
+        _prune(target.parent)
+    return out
+
+def _prune(cache_dir: Path, keep: int = SPATIAL_CACHE_FILES):
+    files = sorted(cache_dir.glob("spatial-*.parquet"), key=lambda p: p.stat().st_mtime, reverse=True)
+    for old in files[keep:]:
+        old.unlink(missing_ok=True)
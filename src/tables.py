@@ -1,22 +1,17 @@
 
+import numpy as np
 import pandas as pd
-from typing import Optional
+from typing import Iterable, Optional, Tuple
 
 def freq(df: pd.DataFrame, var: str, weight: Optional[str] = None) -> pd.DataFrame:
     if var not in df.columns or df.empty:
         return pd.DataFrame({var: [], "n": [], "%": []})
     x = df.dropna(subset=[var])
     if weight and weight in x.columns:
-        s = x.groupby(var)[weight].sum()
-        total = s.sum()
-        pct = 100 * s / total if total else s * 0
-        out = pd.DataFrame({"n": s, "%": pct}).reset_index().sort_values("n", ascending=False)
+        s = x.groupby(var, observed=True)[weight].sum()
     else:
-        s = x[var].value_counts(dropna=False)
-        total = s.sum()
-        pct = 100 * s / total if total else s * 0
-        out = pd.DataFrame({var: s.index, "n": s.values, "%": pct.values})
-    return out
+        s = x[var].value_counts()
+    return freq_from_counts(s, var)
 
 def crosstab(df: pd.DataFrame, row: str, col: str, weight: Optional[str] = None, normalize: Optional[str] = "index") -> pd.DataFrame:
     if row not in df.columns or col not in df.columns or df.empty:
@@ -25,9 +20,16 @@ def crosstab(df: pd.DataFrame, row: str, col: str, weight: Optional[str] = None,
     if x.empty:
         return pd.DataFrame()
     if weight and weight in x.columns:
-        pivot = x.pivot_table(index=row, columns=col, values=weight, aggfunc="sum", fill_value=0)
+        pivot = x.pivot_table(index=row, columns=col, values=weight, aggfunc="sum", fill_value=0, observed=True)
+        if isinstance(pivot.index, pd.CategoricalIndex):
+            pivot.index = pivot.index.remove_unused_categories()
+        if isinstance(pivot.columns, pd.CategoricalIndex):
+            pivot.columns = pivot.columns.remove_unused_categories()
     else:
         pivot = pd.crosstab(x[row], x[col], dropna=False)
+    return _normalize(pivot, normalize)
+
+def _normalize(pivot: pd.DataFrame, normalize: Optional[str]) -> pd.DataFrame:
     if normalize == "index":
         pct = pivot.div(pivot.sum(axis=1).replace(0, 1), axis=0) * 100
         return pct.round(2)
@@ -46,10 +48,116 @@ def summarize_numeric(df: pd.DataFrame, var: str, weight: Optional[str] = None)
     s = pd.to_numeric(x[var], errors="coerce").dropna()
     if s.empty:
         return pd.DataFrame({"stat": [], "value": []})
+    if weight and weight in df.columns:
+        w = pd.to_numeric(df.loc[s.index, weight], errors="coerce").fillna(0)
+        return summary_from_counts(w.groupby(s.to_numpy()).sum())
     out = pd.DataFrame({"stat": ["mean", "median", "min", "max"],
                         "value": [round(float(s.mean()),3), round(float(s.median()),3), float(s.min()), float(s.max())]})
     return out
 
+def weighted_median(values: np.ndarray, weights: np.ndarray) -> float:
+    cum = weights.cumsum()
+    half = cum[-1] / 2
+    lo = values[min(np.searchsorted(cum, half, side="left"), len(values) - 1)]
+    hi = values[min(np.searchsorted(cum, half, side="right"), len(values) - 1)]
+    return float((lo + hi) / 2)
+
+def _value_key(v):
+    try:
+        return (0, float(v), "")
+    except (TypeError, ValueError):
+        return (1, 0.0, str(v))
+
+def sort_counts(s: pd.Series) -> pd.Series:
+    if isinstance(s.index, pd.CategoricalIndex):
+        s = s.sort_index(kind="stable")
+    else:
+        s = s.iloc[sorted(range(len(s)), key=lambda i: _value_key(s.index[i]))]
+    return s.sort_values(ascending=False, kind="stable")
+
+def freq_from_counts(s: pd.Series, var: str) -> pd.DataFrame:
+    s = s[s > 0] if not s.empty else s
+    if s.empty:
+        return pd.DataFrame({var: [], "n": [], "%": []})
+    if isinstance(s.index, pd.CategoricalIndex):
+        s.index = s.index.remove_unused_categories()
+    s = sort_counts(s)
+    total = s.sum()
+    pct = 100 * s / total if total else s * 0
+    return pd.DataFrame({var: s.index, "n": s.values, "%": pct.values})
+
+def crosstab_from_counts(s: pd.Series, row: str, col: str, row_categories: Optional[list] = None,
+                         col_categories: Optional[list] = None, normalize: Optional[str] = "index",
+                         ordered: Tuple[bool, bool] = (False, False)) -> pd.DataFrame:
+    if s.empty:
+        return pd.DataFrame()
+    pivot = s.unstack(level=1, fill_value=0)
+    pivot.index.name, pivot.columns.name = row, col
+    if row_categories is not None:
+        pivot = pivot.reindex(row_categories, fill_value=0)
+        pivot.index = pd.CategoricalIndex(row_categories, categories=row_categories, ordered=ordered[0], name=row)
+    if col_categories is not None:
+        pivot = pivot.reindex(columns=col_categories, fill_value=0)
+        pivot.columns = pd.CategoricalIndex(col_categories, categories=col_categories, ordered=ordered[1], name=col)
+    return _normalize(pivot, normalize)
+
+def summary_from_counts(s: pd.Series) -> pd.DataFrame:
+    s = s[s > 0].sort_index()
+    if s.empty:
+        return pd.DataFrame({"stat": [], "value": []})
+    values = s.index.to_numpy(dtype="float64")
+    counts = s.to_numpy(dtype="float64")
+    mean = float((values * counts).sum() / counts.sum())
+    return pd.DataFrame({"stat": ["mean", "median", "min", "max"],
+                         "value": [round(mean, 3), round(weighted_median(values, counts), 3), float(values[0]), float(values[-1])]})
+
+def count_key(s: pd.Series, binned: bool):
+    if binned and pd.api.types.is_numeric_dtype(s):
+        s = bin_numeric_series(s)
+        return s, list(s.cat.categories), True, s.cat.ordered
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        return s, list(s.cat.categories), False, s.cat.ordered
+    return s, None, False, False
+
+def _less(x, y) -> bool:
+    try:
+        return bool(x < y)
+    except TypeError:
+        return False
+
+def merge_category_order(order: Optional[list], cats: Optional[list]) -> Optional[list]:
+    if order is None or cats is None:
+        return cats if order is None else order
+    out, i, j = [], 0, 0
+    pending_a, pending_b = set(order), set(cats)
+    while i < len(order) and j < len(cats):
+        x, y = order[i], cats[j]
+        take_a = x == y or y in pending_a or (x not in pending_b and not _less(y, x))
+        take_b = x == y or not take_a
+        if take_a:
+            out.append(x)
+            pending_a.discard(x)
+            i += 1
+        if take_b:
+            out.append(y)
+            pending_b.discard(y)
+            j += 1
+    out.extend(order[i:])
+    out.extend(cats[j:])
+    return list(dict.fromkeys(out))
+
+def resolve_categories(index: pd.MultiIndex, orders: list, full: list, weighted: bool) -> list:
+    cats = []
+    for i, order in enumerate(orders):
+        if order is None:
+            cats.append(None)
+        elif full[i] and not weighted:
+            cats.append(order)
+        else:
+            seen = set(index.get_level_values(i + index.nlevels - len(orders)))
+            cats.append([v for v in order if v in seen])
+    return cats
+
 def bin_numeric_series(s: pd.Series, bins: Optional[list] = None, labels: Optional[list] = None) -> pd.Series:
     if bins is None:
         bins = [-float("inf"), 0, 1, 5, 10, float("inf")]
@@ -57,12 +165,20 @@ def bin_numeric_series(s: pd.Series, bins: Optional[list] = None, labels: Option
     s = pd.to_numeric(s, errors="coerce")
     return pd.cut(s, bins=bins, labels=labels, include_lowest=True)
 
+def binned_frame(df: pd.DataFrame, row: str, col: str, extra: Iterable[str] = ()) -> pd.DataFrame:
+    cols = list(dict.fromkeys([row, col] + [c for c in extra if c and c in df.columns]))
+    x = df[cols].dropna(subset=[row, col]).copy()
+    for c in dict.fromkeys((row, col)):
+        if pd.api.types.is_numeric_dtype(x[c]):
+            x[c] = bin_numeric_series(x[c])
+        elif isinstance(x[c].dtype, pd.CategoricalDtype):
+            x[c] = x[c].cat.remove_unused_categories()
+    return x
+
 def crosstab_binned(df: pd.DataFrame, row: str, col: str, weight: Optional[str] = None, normalize: Optional[str] = "index") -> pd.DataFrame:
-    x = df.dropna(subset=[row, col]).copy()
+    if row not in df.columns or col not in df.columns:
+        return pd.DataFrame()
+    x = binned_frame(df, row, col, extra=[weight])
     if x.empty:
         return pd.DataFrame()
-    if pd.api.types.is_numeric_dtype(x[row]):
-        x[row] = bin_numeric_series(x[row])
-    if pd.api.types.is_numeric_dtype(x[col]):
-        x[col] = bin_numeric_series(x[col])
     return crosstab(x, row, col, weight=weight, normalize=normalize)
@@ -1,5 +1,105 @@
 
-import streamlit as st
+import json
+import threading
+import time
+import tracemalloc
+import uuid
+import weakref
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Optional
+
+import pandas as pd
 
 def cache_data(func):
+    import streamlit as st
     return st.cache_data(show_spinner=False)(func)
+
+_TRACE_LOCK = threading.Lock()
+_TRACE = {"users": 0, "owned": False}
+
+def _acquire_tracing():
+    with _TRACE_LOCK:
+        if _TRACE["users"] == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _TRACE["owned"] = True
+        _TRACE["users"] += 1
+
+def _release_tracing():
+    with _TRACE_LOCK:
+        _TRACE["users"] -= 1
+        if _TRACE["users"] == 0 and _TRACE["owned"]:
+            tracemalloc.stop()
+            _TRACE["owned"] = False
+
+class Profiler:
+    def __init__(self, enabled: bool = True, trace_memory: bool = False, run_id: Optional[str] = None):
+        self.enabled = enabled
+        self.trace_memory = trace_memory and enabled
+        self.run_id = run_id or uuid.uuid4().hex[:12]
+        self.records: List[dict] = []
+        self._stack: List[list] = []
+        self._release = None
+        if self.trace_memory:
+            _acquire_tracing()
+            self._release = weakref.finalize(self, _release_tracing)
+
+    def close(self):
+        if self._release is not None:
+            self._release()
+
+    @contextmanager
+    def stage(self, stage: str, name: Optional[str] = None, rows: Optional[int] = None):
+        if not self.enabled:
+            yield {}
+            return
+        rec = {"run": self.run_id, "stage": stage, "name": name, "rows": rows,
+               "ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds")}
+        if self.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                self._stack[-1][1] = max(self._stack[-1][1], peak)
+            tracemalloc.reset_peak()
+            self._stack.append([current, current])
+        t0 = time.perf_counter()
+        try:
+            yield rec
+        finally:
+            rec["ms"] = round(1000 * (time.perf_counter() - t0), 2)
+            if self.trace_memory:
+                start, child_peak = self._stack.pop()
+                peak = max(tracemalloc.get_traced_memory()[1], child_peak)
+                rec["peak_mb"] = round((peak - start) / 1e6, 2)
+                if self._stack:
+                    self._stack[-1][1] = max(self._stack[-1][1], peak)
+                tracemalloc.reset_peak()
+            self.records.append(rec)
+
+    def frame(self) -> pd.DataFrame:
+        cols = ["stage", "name", "ms", "rows"] + (["peak_mb"] if self.trace_memory else [])
+        if not self.records:
+            return pd.DataFrame(columns=cols)
+        return pd.DataFrame(self.records)[cols]
+
+    def summary(self) -> pd.DataFrame:
+        df = self.frame()
+        if df.empty:
+            return df
+        agg = {"ms": "sum", "rows": "max"}
+        if self.trace_memory:
+            agg["peak_mb"] = "max"
+        out = df.groupby("stage", sort=False).agg(agg)
+        out.insert(0, "llamadas", df.groupby("stage", sort=False).size())
+        return out.sort_values("ms", ascending=False)
+
+    def to_jsonl(self, path: Optional[str] = None) -> str:
+        text = "".join(json.dumps(r, ensure_ascii=False, default=str) + "\n" for r in self.records)
+        if path:
+            p = Path(path)
+            p.parent.mkdir(parents=True, exist_ok=True)
+            with open(p, "a", encoding="utf-8") as f:
+                f.write(text)
+        return text
+
+NULL_PROFILER = Profiler(enabled=False)
@@ -0,0 +1,20 @@
+import pandas as pd
+import pytest
+
+from src import batch, catalog
+
+pytest.importorskip("pyarrow")
+
+def test_sector_filter_uses_raw_keys(tmp_path, monkeypatch):
+    monkeypatch.setattr(catalog, "MAX_PARTITIONS", 1)
+    data, codebook = tmp_path / "r1.csv", tmp_path / "codebook.csv"
+    pd.DataFrame({"SECTOR": [1, 1, 2, 2, 2], "x": [1, 2, 1, 1, 2]}).to_csv(data, index=False)
+    pd.DataFrame({"variable": ["SECTOR", "SECTOR"], "value": [1, 2], "label_value": ["Norte", "Sur"],
+                  "label_variable": ["Sector", "Sector"]}).to_csv(codebook, index=False)
+    cfg = {"codebook_path": str(codebook), "cache_dir": str(tmp_path / "cache"), "key_filter_col": "SECTOR"}
+    plan = {"blocks": [{"name": "B", "filter": {}, "tables": [{"freq": "x"}]}]}
+    waves = {"r1": str(data)}
+    assert not batch.open_catalog(cfg, waves).partitioned
+    batch._init_worker(cfg, plan, waves)
+    counts = {sector: batch.run_task("r1", sector, 0)[3] for sector in (batch.ALL_SECTORS, "1", "2")}
+    assert counts == {batch.ALL_SECTORS: 5, "1": 2, "2": 3}
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.cache import CACHE_VERSION, ResultCache, cache_key, nbytes
+
+pytest.importorskip("pyarrow")
+
+def _table(seed, rows=20):
+    rng = np.random.default_rng(seed)
+    cols = pd.CategoricalIndex(["si", "no", "ns"], categories=["si", "no", "ns", "nr"], ordered=True, name="p1")
+    df = pd.DataFrame(rng.random((rows, 3)), columns=cols)
+    df.index = pd.Index([f"fila {i}" for i in range(rows)], dtype=object, name="SECTOR")
+    return df
+
+def test_evicts_by_bytes():
+    frames = [_table(i) for i in range(4)]
+    cache = ResultCache(max_bytes=2 * nbytes(frames[0]) + 10)
+    for i, df in enumerate(frames):
+        cache.put(("t", i), df)
+    assert len(cache) == 2 and cache.bytes <= cache.max_bytes
+    assert ("t", 0) not in cache and ("t", 1) not in cache
+    assert cache.get(("t", 3)) is frames[3]
+    assert cache.info()["evictions"] == 2
+
+@pytest.mark.parametrize("df", [
+    _table(0),
+    _table(1).reset_index().assign(cat=pd.Categorical(["a", "b"] * 10, categories=["b", "a", "c"]), txt=["x", None] * 10),
+])
+def test_spill_round_trip(tmp_path, df):
+    cache = ResultCache(max_bytes=1, spill_dir=str(tmp_path))
+    cache.put("k", df)
+    assert len(cache) == 0
+    assert (tmp_path / f"v{CACHE_VERSION}-{cache_key('k')}.arrow").exists()
+    back = ResultCache(max_bytes=1, spill_dir=str(tmp_path)).get("k")
+    pd.testing.assert_frame_equal(back, df)
+    assert type(back.columns) is type(df.columns)
+
+def test_spill_max_bytes_prunes_oldest(tmp_path):
+    cache = ResultCache(max_bytes=1, spill_dir=str(tmp_path), spill_max_bytes=1)
+    for i in range(3):
+        cache.put(("t", i), _table(i))
+    files = list(tmp_path.glob("*.arrow"))
+    assert [p.name for p in files] == [f"v{CACHE_VERSION}-{cache_key(('t', 2))}.arrow"]
+    assert cache.get(("t", 0)) is None
+    pd.testing.assert_frame_equal(cache.get(("t", 2)), _table(2))
+
+def test_stale_files_removed(tmp_path):
+    ResultCache(max_bytes=1, spill_dir=str(tmp_path)).put("k", _table(0))
+    stale = [tmp_path / f"{cache_key('k')}.arrow", tmp_path / f"v{CACHE_VERSION - 1}-{cache_key('k')}.arrow"]
+    for p in stale:
+        p.write_bytes(b"viejo")
+    cache = ResultCache(max_bytes=1, spill_dir=str(tmp_path))
+    assert not any(p.exists() for p in stale)
+    assert "k" in cache and cache.info()["disk_entries"] == 1
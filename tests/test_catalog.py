@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.catalog import WAVE_COL, Catalog
+
+pytest.importorskip("pyarrow")
+
+def _wave(seed, n=400):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({"SECTOR": rng.choice(["A", "B", "C"], n), "edad": rng.integers(0, 90, n).astype(float),
+                         "tipo": rng.choice(["casa", "depto"], n)})
+
+@pytest.fixture
+def catalog(tmp_path):
+    waves = {}
+    for i, name in enumerate(["r1", "r2"]):
+        path = tmp_path / f"{name}.csv"
+        _wave(i).to_csv(path, index=False)
+        waves[name] = str(path)
+    return Catalog(str(tmp_path / "catalog"), waves, key_col="SECTOR", cache_dir=str(tmp_path / "cache"))
+
+def _expected(waves, spec):
+    frames = [_wave(i).assign(**{WAVE_COL: w}) for i, w in enumerate(["r1", "r2"]) if w in waves]
+    df = pd.concat(frames, ignore_index=True)
+    return df[df["SECTOR"].isin(spec["sectors"]) & df["edad"].between(18, 64) & (df["tipo"] == "casa")]
+
+@pytest.mark.parametrize("waves", [["r1"], ["r1", "r2"]])
+def test_pushdown_matches_pandas_filter(catalog, waves):
+    spec = {"sectors": ["A", "C"]}
+    got = catalog.read(["SECTOR", "edad", "tipo"], waves=waves, sectors=spec["sectors"],
+                       filter_spec={"range": {"edad": [18, 64]}, "eq": {"tipo": "casa"}})
+    exp = _expected(waves, spec)
+    cols = ["SECTOR", "edad", "tipo", WAVE_COL]
+    assert catalog.partitioned
+    pd.testing.assert_frame_equal(got[cols].astype(str).reset_index(drop=True), exp[cols].astype(str).reset_index(drop=True))
+
+def test_reopen_without_rebuild(catalog):
+    reopened = Catalog(str(catalog.root), catalog.waves, key_col="SECTOR", cache_dir=catalog.cache_dir, build=False)
+    assert reopened.key == catalog.key
+    assert sorted(map(str, reopened.sectors())) == ["A", "B", "C"]
+    assert len(reopened.read(["edad"])) == 800
+
+def test_iter_read_matches_read(catalog):
+    spec = {"range": {"edad": [18, 64]}}
+    parts = list(catalog.iter_read(["SECTOR", "edad"], waves=["r1", "r2"], filter_spec=spec, batch_size=50))
+    assert len(parts) > 2
+    pd.testing.assert_frame_equal(pd.concat(parts).sort_index(), catalog.read(["SECTOR", "edad"], waves=["r1", "r2"], filter_spec=spec))
+
+def _mixed(seed, n=300):
+    rng = np.random.default_rng(seed)
+    df = _wave(seed, n)
+    df.loc[rng.random(n) < 0.1, "edad"] = np.nan
+    df.loc[rng.random(n) < 0.1, "tipo"] = None
+    return df.assign(codigo=rng.integers(1, 5, n), mixto=rng.choice(["1", "2", "7", "x"], n))
+
+@pytest.fixture
+def mixed_catalog(tmp_path):
+    waves = {}
+    for i, name in enumerate(["r1", "r2"]):
+        path = tmp_path / f"{name}.csv"
+        _mixed(i).to_csv(path, index=False)
+        waves[name] = str(path)
+    return Catalog(str(tmp_path / "catalog"), waves, key_col="SECTOR", cache_dir=str(tmp_path / "cache"))
+
+@pytest.mark.parametrize("spec", [
+    {"in": {"tipo": ["casa"]}},
+    {"in": {"codigo": [1, 3]}},
+    {"in": {"edad": [30, 31.0]}},
+    {"in": {"edad": [30, "x"]}},
+    {"in": {"mixto": ["1", 2]}},
+    {"in_text": {"tipo": ["AS"]}},
+    {"eq": {"tipo": "casa"}},
+    {"eq": {"codigo": 2}},
+    {"not_in": {"tipo": ["casa"]}},
+    {"not_in": {"codigo": [1]}},
+    {"range": {"edad": [18, 64]}},
+    {"range": {"edad": {"min": 60}}},
+    {"range": {"mixto": [1, 2]}},
+    {"isnull": {"edad": True}},
+    {"isnull": {"tipo": False}},
+    {"range": {"edad": [18, 64]}, "not_in": {"SECTOR": ["B"]}, "in_text": {"tipo": ["dep"]}},
+])
+def test_read_filter_matches_mask(mixed_catalog, spec):
+    from src.filters import MaskCache, filter_mask
+    full = mixed_catalog.read()
+    exp = full[filter_mask(full, spec, cache=MaskCache(), data_key="full")][["SECTOR", WAVE_COL]]
+    got = mixed_catalog.read(["SECTOR"], filter_spec=spec)
+    pd.testing.assert_frame_equal(got, exp)
+    parts = list(mixed_catalog.iter_read(["SECTOR"], filter_spec=spec, batch_size=64))
+    pd.testing.assert_frame_equal(pd.concat(parts).sort_index() if parts else got.iloc[:0], exp)
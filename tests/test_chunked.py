@@ -0,0 +1,16 @@
+import pytest
+
+from src.cube import build_cube_chunked, merge_cubes, build_cube
+from test_cube import PLAN, assert_cube_matches_rows, survey_frame
+
+@pytest.mark.parametrize("weight", [None, "w"])
+@pytest.mark.parametrize("size", [7, 97, 600])
+def test_chunked_cube_matches_row_path(weight, size):
+    df = survey_frame()
+    chunks = (df.iloc[i:i + size] for i in range(0, len(df), size))
+    assert_cube_matches_rows(build_cube_chunked(chunks, "sector", PLAN, weight=weight), df, weight)
+
+def test_merge_keeps_categories_seen_in_later_chunks():
+    df = survey_frame().sort_values("tipo", na_position="first")
+    a, b = df.iloc[:300], df.iloc[300:]
+    assert_cube_matches_rows(merge_cubes(build_cube(a, "sector", PLAN), build_cube(b, "sector", PLAN)), df)
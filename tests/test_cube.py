@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.cube import build_cube, cube_table
+from src.plan import compile_plan, run_table
+from src.tables import freq
+
+PLAN = compile_plan({"blocks": [
+    {"name": "todos", "filter": {}, "tables": [{"freq": "tipo"}, {"freq": "cuartos"}, {"crosstab": {"row": "tipo", "col": "cuartos"}},
+                                               {"summary": {"var": "ingreso"}}]},
+    {"name": "casas", "filter": {"in": {"tipo": ["casa"]}}, "tables": [{"freq": "cuartos"}]},
+]})
+
+def survey_frame(n=600, seed=3):
+    rng = np.random.default_rng(seed)
+    tipo = rng.choice(["casa", "depto", "cuarto", None], n, p=[0.5, 0.3, 0.15, 0.05])
+    return pd.DataFrame({"sector": rng.choice(["N", "S", "E"], n), "tipo": pd.Series(tipo, dtype=object),
+                         "cuartos": rng.integers(1, 6, n).astype(float), "ingreso": rng.gamma(2.0, 500.0, n).round(),
+                         "w": rng.uniform(0.5, 3.0, n).round(2)})
+
+def assert_cube_matches_rows(cube, df, weight=None):
+    for fkey, tables in PLAN["nodes"].items():
+        block = df if fkey == "{}" else df[df["tipo"] == "casa"]
+        for table in tables:
+            pd.testing.assert_frame_equal(cube_table(cube, fkey, table), run_table(block, table, weight=weight), check_dtype=False)
+
+@pytest.mark.parametrize("weight", [None, "w"])
+def test_cube_matches_row_path(weight):
+    df = survey_frame()
+    assert_cube_matches_rows(build_cube(df, "sector", PLAN, weight=weight), df, weight)
+
+def test_cube_slice_matches_subset():
+    df = survey_frame()
+    cube = build_cube(df, "sector", PLAN)
+    table = ("crosstab", "tipo", "cuartos", None)
+    expected = run_table(df[df["sector"].isin(["N", "E"])], table)
+    pd.testing.assert_frame_equal(cube_table(cube, "{}", table, selected=["N", "E"]), expected, check_dtype=False)
+
+def test_freq_known_answer_and_ties():
+    df = pd.DataFrame({"x": ["b", "a", "c", "a", "b", "c", "d"], "w": [1, 2, 1, 2, 1, 1, 4]})
+    out = freq(df, "x")
+    assert list(out["x"]) == ["a", "b", "c", "d"]
+    assert list(out["n"]) == [2, 2, 2, 1]
+    weighted = freq(df, "x", weight="w")
+    assert list(weighted["x"]) == ["a", "d", "b", "c"]
+    assert list(weighted["n"]) == [4, 4, 2, 2]
+    cube = build_cube(df.assign(sector="N"), "sector", compile_plan({"blocks": [{"tables": [{"freq": "x"}]}]}), weight="w")
+    pd.testing.assert_frame_equal(cube_table(cube, "{}", ("freq", "x")), weighted, check_dtype=False)
@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.estimation import build_design, estimate_freq, estimate_summary, replicate_mb
+
+def _frame():
+    return pd.DataFrame({"x": ["a", "a", "b", "b", "b"], "v": [1.0, 2.0, 3.0, 4.0, 5.0],
+                         "w": [1.0, 2.0, 3.0, 1.0, 1.0],
+                         "r1": [1.0, 1.0, 2.0, 0.0, 2.0], "r2": [2.0, 0.0, 1.0, 1.0, 1.0], "r3": [0.0, 3.0, 3.0, 2.0, 0.0]})
+
+def test_freq_se_with_given_replicates():
+    df = _frame()
+    design = build_design(df, weight="w", replicate_cols=["r1", "r2", "r3"], scale=0.5)
+    out = estimate_freq(df, "x", design).set_index("x")
+    theta = 3 / 8
+    reps = np.array([2 / 6, 2 / 5, 3 / 8])
+    se = np.sqrt(0.5 * ((reps - theta) ** 2).sum())
+    assert out.loc["a", "%"] == round(100 * theta, 2)
+    assert out.loc["a", "EE"] == round(100 * se, 2)
+    assert out.loc["b", "EE"] == round(100 * se, 2)
+
+def test_bootstrap_se_matches_manual_loop():
+    df = _frame()
+    design = build_design(df, weight="w", replicates=20, seed=7)
+    out = estimate_summary(df, "v", design).set_index("stat")
+    x = df["v"].to_numpy()
+    means = [(x * design.replicates[:, r]).sum() / design.replicates[:, r].sum() for r in range(20)]
+    theta = (x * df["w"]).sum() / df["w"].sum()
+    se = np.sqrt(((np.asarray(means) - theta) ** 2).sum() / 19)
+    assert out.loc["mean", "value"] == round(theta, 3)
+    assert out.loc["mean", "EE"] == pytest.approx(round(se, 3), abs=1e-3)
+
+def test_bootstrap_keeps_strata_totals():
+    df = _frame().assign(h=[0, 0, 1, 1, 1])
+    design = build_design(df, replicates=50, seed=1, strata="h")
+    for rows, n_h in ((slice(0, 2), 2), (slice(2, 5), 3)):
+        assert np.allclose(design.replicates[rows].sum(axis=0), n_h)
+
+def test_replicate_matrix_limit():
+    assert replicate_mb(1_000_000, 100) == pytest.approx(381.5, abs=0.1)
+    with pytest.raises(MemoryError):
+        build_design(_frame(), replicates=100, max_mb=1e-4)
+
+def test_mean_se_matches_float64_reference():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"v": 1e4 + rng.normal(0, 1, 50_000), "w": rng.uniform(0.5, 3.0, 50_000)})
+    design = build_design(df, weight="w", replicates=50, seed=1)
+    out = estimate_summary(df, "v", design).set_index("stat")
+    x, reps = df["v"].to_numpy(), design.replicates.astype(np.float64)
+    theta = (x * df["w"]).sum() / df["w"].sum()
+    se = np.sqrt((((x @ reps) / reps.sum(axis=0) - theta) ** 2).sum() / 49)
+    assert out.loc["mean", "EE"] == pytest.approx(round(se, 3), abs=1e-3)
+
+def test_weighted_quantiles():
+    df = _frame()
+    design = build_design(df, weight="w", replicate_cols=["r1", "r2", "r3"], quantiles=(0.25, 0.5, 0.75))
+    out = estimate_summary(df, "v", design).set_index("stat")
+    assert list(out.index) == ["mean", "p25", "median", "p75"]
+    assert list(out["value"]) == [round(23 / 8, 3), 2.0, 3.0, 3.5]
+
+def test_subsets_share_the_replicate_matrix():
+    df = _frame()
+    design = build_design(df, weight="w", replicates=10, seed=2)
+    sub = design.subset(df.index[[4, 1, 2]]).reweight(df["v"].iloc[[4, 1, 2]])
+    assert sub.replicates is design.replicates
+    expected = design.replicates[[4, 1, 2]] * (df["v"].to_numpy()[[4, 1, 2]] / df["w"].to_numpy()[[4, 1, 2]])[:, None]
+    np.testing.assert_allclose(sub.totals(np.array([0, 1, 0]), 2), [expected[[0, 2]].sum(axis=0), expected[1]], rtol=1e-6)
@@ -0,0 +1,39 @@
+import shutil
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from src.io import read_codebook
+from src.labels import LABELS_VERSION, build_label_maps, load_label_maps
+
+pytest.importorskip("openpyxl")
+
+DATA = Path(__file__).resolve().parents[1] / "data"
+
+@pytest.fixture
+def codebook(tmp_path):
+    path = tmp_path / "Codebook.xlsx"
+    shutil.copy(DATA / "Codebook.xlsx", path)
+    return str(path)
+
+@pytest.fixture
+def columns():
+    return list(pd.read_csv(DATA / "encuesta.csv", nrows=0).columns)
+
+def test_cached_maps_match_codebook(codebook, columns, tmp_path):
+    cache = tmp_path / "cache"
+    fresh = build_label_maps(read_codebook(codebook), df_columns=columns)
+    assert load_label_maps(codebook, columns, cache_dir=str(cache)) == fresh
+    assert len(list(cache.glob(f"labels-v{LABELS_VERSION}-*.pkl"))) == 1
+    assert load_label_maps(codebook, columns, cache_dir=str(cache)) == fresh
+
+def test_old_pickles_pruned(codebook, columns, tmp_path):
+    cache = tmp_path / "cache"
+    cache.mkdir()
+    stale = [cache / f"labels-v{LABELS_VERSION - 1}-abc-def.pkl", cache / f"labels-v{LABELS_VERSION}-viejo-def.pkl"]
+    for p in stale:
+        p.write_bytes(b"viejo")
+    load_label_maps(codebook, columns, cache_dir=str(cache))
+    assert not any(p.exists() for p in stale)
+    assert len(list(cache.glob("labels-*.pkl"))) == 1
@@ -0,0 +1,35 @@
+import pandas as pd
+import pytest
+
+from src.profiles import combine_profiles, load_profile, profile_frame, profile_stats
+
+pytest.importorskip("pyarrow")
+
+def _load(path, fp, cache):
+    return load_profile(str(path), ["SECTOR", "x"], {}, "SECTOR", None, False, str(cache), fp, None)
+
+def test_old_profiles_pruned(tmp_path):
+    cache = tmp_path / "cache"
+    r1, r2 = tmp_path / "r1.csv", tmp_path / "r2.csv"
+    for p in (r1, r2):
+        pd.DataFrame({"SECTOR": ["A", "B", "A"], "x": [1, 2, 3]}).to_csv(p, index=False)
+    _load(r1, "fp1", cache)
+    _load(r2, "fp2", cache)
+    _load(r1, "fp3", cache)
+    names = sorted(p.name.split("-")[1] for p in cache.glob("profile-*.parquet"))
+    assert names == ["fp2", "fp2", "fp3", "fp3"]
+
+def _profile(df):
+    return {"by": "SECTOR", "weighted": False, **profile_frame(df, by="SECTOR", max_values=2)}
+
+def test_cardinality_marks_upper_bounds():
+    df = pd.DataFrame({"SECTOR": list("AAABBB"), "x": [1, 2, 3, 2, 3, 4]})
+    p = _profile(df)
+    for selected, n in ((None, 4), (["A"], 3)):
+        stats = profile_stats(p, "x", selected)
+        assert stats["nunique"] == n and stats["nunique_exact"]
+    both = profile_stats(p, "x", ["A", "B"])
+    assert both["nunique"] >= 4 and not both["nunique_exact"]
+    assert profile_stats(p, "SECTOR", ["A", "B"])["nunique_exact"]
+    combined = profile_stats(combine_profiles([p, _profile(df)]), "x")
+    assert combined["nunique"] >= 4 and not combined["nunique_exact"]
@@ -0,0 +1,24 @@
+import numpy as np
+import pandas as pd
+
+from src.spatial import PolygonIndex, _edges, _rings, assign_polygons, contains
+
+SQUARE = {"type": "Polygon", "coordinates": [[[0, 0], [4, 0], [4, 4], [0, 4], [0, 0]], [[1, 1], [2, 1], [2, 2], [1, 2], [1, 1]]]}
+TRIANGLE = {"type": "Polygon", "coordinates": [[[5, 0], [9, 0], [5, 4], [5, 0]]]}
+GEO = {"type": "FeatureCollection", "features": [
+    {"type": "Feature", "properties": {"id": "cuadro"}, "geometry": SQUARE},
+    {"type": "Feature", "properties": {"id": "triangulo"}, "geometry": TRIANGLE},
+]}
+
+def test_contains_with_hole():
+    edges = _edges(_rings(SQUARE))
+    x = np.array([0.5, 1.5, 3.5, 4.5, 3.0])
+    y = np.array([0.5, 1.5, 3.5, 0.5, 1.5])
+    assert contains(edges, x, y, max_cells=8).tolist() == [True, False, True, False, True]
+
+def test_assign_polygons_known_points():
+    df = pd.DataFrame({"lat": [0.5, 1.5, 1.0, 3.0, 2.0, np.nan], "lon": [0.5, 1.5, 6.0, 8.0, 20.0, 1.0]})
+    for grid in (1, 4, 32):
+        out = assign_polygons(df, "lat", "lon", PolygonIndex(GEO, key_prop="id", grid_size=grid))
+        assert out.tolist() == ["cuadro", None, "triangulo", None, None, None]
+        assert out.index.equals(df.index)